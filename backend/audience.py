@@ -0,0 +1,203 @@
+import os
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Round state for big rooms (streamer audiences). Votes and ready flags live
+# in packed arrays indexed by a player slot instead of on every Player, so
+# tallies, the leader, ties and resets run over the arrays in C. GamePlay
+# switches a room over at the start of a session once it has
+# AUDIENCE_THRESHOLD players.
+
+AUDIENCE_THRESHOLD = int(os.environ.get("AUDIENCE_THRESHOLD", 100))
+# AUDIENCE_NUMPY=0 keeps the array/bytearray version even with NumPy installed
+USE_NUMPY = numpy is not None and os.environ.get("AUDIENCE_NUMPY", "1") != "0"
+
+# Slots only ever get appended, so slot order is join order, same as loPlayers.
+# A player who leaves keeps their slot with votes -1 until the next round.
+NO_VOTE = -1
+GONE = -1
+
+
+class AudienceRound:
+    def __init__(self, players, use_numpy: bool = USE_NUMPY):
+        self.use_numpy = use_numpy
+        self.slots: dict[str, int] = {}
+        self.ids: list[str] = []
+        self.gone: list[int] = []
+        self.size = 0
+        self.votes = self.zeros(0, "i")
+        self.voted_for = self.zeros(0, "i")
+        self.has_voted = self.zeros(0, "B")
+        self.ready_vote = self.zeros(0, "B")
+        self.ready_start = self.zeros(0, "B")
+        for player in players:
+            self.add(player)
+        # Votes can point at players added after the voter
+        for player in players:
+            self.voted_for[self.slots[player.id]] = self.slots.get(player.voted_for_id, NO_VOTE)
+
+    def zeros(self, n: int, typecode: str):
+        if self.use_numpy:
+            return numpy.zeros(n, numpy.int32 if typecode == "i" else numpy.uint8)
+        if typecode == "B":
+            return bytearray(n)
+        return array(typecode, bytes(n * 4))
+
+    def grow(self):
+        # Doubles the capacity of every array
+        extra = max(len(self.votes), 16)
+        for name in ("votes", "voted_for", "has_voted", "ready_vote", "ready_start"):
+            values = getattr(self, name)
+            more = self.zeros(extra, "i" if name in ("votes", "voted_for") else "B")
+            if self.use_numpy:
+                setattr(self, name, numpy.concatenate([values, more]))
+            else:
+                values.extend(more)
+
+    def add(self, player):
+        # Takes over whatever round state the player already has
+        if self.size == len(self.votes):
+            self.grow()
+        slot = self.size
+        self.size += 1
+        self.slots[player.id] = slot
+        self.ids.append(player.id)
+        self.votes[slot] = player.votes
+        self.voted_for[slot] = self.slots.get(player.voted_for_id, NO_VOTE)
+        self.has_voted[slot] = player.has_voted
+        self.ready_vote[slot] = player.ready_to_vote
+        self.ready_start[slot] = player.ready_to_start
+        return slot
+
+    def remove(self, player_id: str) -> tuple[str | None, list[str]]:
+        # Returns who they had voted for and the voters who voted for them,
+        # whose votes are cleared so they can vote again
+        slot = self.slots.pop(player_id)
+        target = self.voted_for[slot]
+        target_id = self.ids[target] if target != NO_VOTE and self.ids[target] in self.slots else None
+        # Their own vote for themselves is already taken back with has_voted
+        voters = [voter for voter in self.find(self.voted_for, slot) if voter != slot]
+        for voter in voters:
+            self.voted_for[voter] = NO_VOTE
+            self.has_voted[voter] = 0
+        self.votes[slot] = GONE
+        self.voted_for[slot] = NO_VOTE
+        self.has_voted[slot] = 0
+        self.ready_vote[slot] = 0
+        self.ready_start[slot] = 0
+        self.gone.append(slot)
+        return target_id, [self.ids[voter] for voter in voters]
+
+    def find(self, values, value: int) -> list[int]:
+        if self.use_numpy:
+            return numpy.flatnonzero(values[:self.size] == value).tolist()
+        return [i for i, v in enumerate(values[:self.size]) if v == value]
+
+    def count(self, values, value: int) -> int:
+        if self.use_numpy:
+            return int(numpy.count_nonzero(values[:self.size] == value))
+        return values[:self.size].count(value)
+
+    def fill(self, values, value: int):
+        if self.use_numpy:
+            values[:self.size] = value
+        elif isinstance(values, bytearray):
+            values[:self.size] = bytes([value]) * self.size
+        else:
+            values[:self.size] = array(values.typecode, [value]) * self.size
+
+    def cast(self, voter_id: str, target_id: str | None) -> tuple[str | None, bool]:
+        # Points the voter at target_id (None for nobody), returns who they
+        # voted for before and whether this is their first vote
+        voter = self.slots[voter_id]
+        previous = self.voted_for[voter]
+        previous_id = self.ids[previous] if previous != NO_VOTE else None
+        self.voted_for[voter] = self.slots.get(target_id, NO_VOTE)
+        first = not self.has_voted[voter]
+        self.has_voted[voter] = 1
+        return previous_id, first
+
+    def change_votes(self, player_id: str, delta: int) -> int:
+        slot = self.slots[player_id]
+        self.votes[slot] += delta
+        return int(self.votes[slot])
+
+    def votes_of(self, player_id: str) -> int:
+        return int(self.votes[self.slots[player_id]])
+
+    def toggle(self, flags, player_id: str) -> bool:
+        slot = self.slots[player_id]
+        flags[slot] = not flags[slot]
+        return bool(flags[slot])
+
+    def max_votes(self) -> int:
+        if not self.slots:
+            return 0
+        if self.use_numpy:
+            return int(self.votes[:self.size].max())
+        return max(self.votes[:self.size])
+
+    def is_tie(self) -> bool:
+        top = self.max_votes()
+        return bool(self.slots) and self.count(self.votes, top) > 1
+
+    def leader(self) -> str | None:
+        # Lowest slot with the most votes, which is roster order
+        top = self.max_votes()
+        if top <= 0:
+            return None
+        if self.use_numpy:
+            return self.ids[int(numpy.argmax(self.votes[:self.size] == top))]
+        return self.ids[self.votes.index(top)]
+
+    def counts(self) -> list[int]:
+        # Votes of everyone still here, in loPlayers order
+        if self.use_numpy:
+            votes = self.votes[:self.size]
+            return votes[votes != GONE].tolist()
+        return [v for v in self.votes[:self.size] if v != GONE]
+
+    def reset(self):
+        # Start of a round: everything back to zero, dropping the slots of
+        # players who left
+        live = sorted(self.slots, key=self.slots.get)
+        self.slots = {player_id: slot for slot, player_id in enumerate(live)}
+        self.ids = live
+        self.gone = []
+        self.size = len(live)
+        capacity = max(self.size, 16)
+        self.votes = self.zeros(capacity, "i")
+        self.voted_for = self.zeros(capacity, "i")
+        self.has_voted = self.zeros(capacity, "B")
+        self.ready_vote = self.zeros(capacity, "B")
+        self.ready_start = self.zeros(capacity, "B")
+        self.fill(self.voted_for, NO_VOTE)
+
+    def reset_votes(self):
+        self.fill(self.votes, 0)
+        self.fill(self.voted_for, NO_VOTE)
+        self.fill(self.has_voted, 0)
+        for slot in self.gone:
+            self.votes[slot] = GONE
+
+    def reset_ready_vote(self):
+        self.fill(self.ready_vote, 0)
+
+    def reset_ready_start(self):
+        self.fill(self.ready_start, 0)
+
+    def write_back(self, players: dict):
+        # Copies the arrays onto the Player objects, for snapshots and for
+        # leaving audience mode
+        for player_id, player in players.items():
+            slot = self.slots[player_id]
+            player.votes = int(self.votes[slot])
+            target = self.voted_for[slot]
+            player.voted_for_id = self.ids[target] if target != NO_VOTE else None
+            player.has_voted = bool(self.has_voted[slot])
+            player.ready_to_vote = bool(self.ready_vote[slot])
+            player.ready_to_start = bool(self.ready_start[slot])
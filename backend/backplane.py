@@ -0,0 +1,27 @@
+# A backplane carries a ConnectionManager's frames to the sockets of a room.
+# It is bound to the manager's deliver(game_id, player_id, frame, feature,
+# fallback, overrides), which pushes a frame to this process's own sockets.
+#
+# Every room lives on exactly one worker: with several workers, router.py
+# sends a room's REST calls and websockets to the worker owning its game ID
+# (see sharding.py), so the local backplane is all a worker needs. A
+# backplane for rooms spread over several workers would also have to share
+# active_games between them.
+
+
+class LocalBackplane:
+    # Single process: publishing is just delivering to our own sockets
+    def __init__(self):
+        self.deliver = None
+
+    def bind(self, deliver):
+        self.deliver = deliver
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, game_id: str, player_id: str | None, frame: bytes, feature: str = None, fallback=None, overrides=None):
+        self.deliver(game_id, player_id, frame, feature, fallback, overrides)
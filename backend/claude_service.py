@@ -1,19 +1,25 @@
 from dotenv import load_dotenv
+import asyncio
+import os
 import random
 import anthropic
 
 load_dotenv()
 
-client = anthropic.Anthropic()
+# Hard limit on a single word request, past this the caller falls back to default words
+WORD_TIMEOUT_SECONDS = float(os.environ.get("WORD_TIMEOUT_SECONDS", "8"))
 
-def generate_secret_word(category: str, count:int, used_words: list[str]) -> list[str]:
+# Async client so a slow request only waits its own room, not the whole event loop
+client = anthropic.AsyncAnthropic(timeout=WORD_TIMEOUT_SECONDS, max_retries=0)
+
+async def generate_secret_word(category: str, count:int, used_words: list[str]) -> list[str]:
     exclude = ""
     if used_words:
         exclude = f" Do not use these words: {', '.join(used_words)}."
-    
-    message = client.messages.create(
+
+    message = await asyncio.wait_for(client.messages.create(
         model="claude-haiku-4-5-20251001",
-        max_tokens=100,
+        max_tokens=max(100, count * 10),
         temperature=1.0,
         messages=[
             {
@@ -21,11 +27,11 @@ def generate_secret_word(category: str, count:int, used_words: list[str]) -> lis
                 "content": f"Give me {count} words related to the category '{category}' that would work for a word-guessing game. The words should be specific enough to hint at but not too obvious.{exclude} Return only the words, one per line, nothing else."
             }
         ]
-    )
-    
-    words = message.content[0].text.strip().split("\n")
+    ), WORD_TIMEOUT_SECONDS)
+
+    words = [w.strip() for w in message.content[0].text.strip().split("\n") if w.strip()]
     return words
 
 if __name__ == "__main__":
-    word = generate_secret_word("Ramadan", 6, [])
-    print(word)
\ No newline at end of file
+    word = asyncio.run(generate_secret_word("Ramadan", 6, []))
+    print(word)
@@ -1,33 +1,340 @@
+import asyncio
+import json
+import time
+from contextlib import suppress
+
+from backplane import LocalBackplane
+from metrics import broadcast_fanout, broadcast_seconds
+from protocol import pack
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# How many frames a client may have waiting before it is considered too slow
+SEND_QUEUE_SIZE = 64
+
+
+def encode_message(message: dict) -> bytes:
+    # Encode a message once so it can be sent to any number of sockets
+    if orjson:
+        return orjson.dumps(message)
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+class ClientConnection:
+    # One websocket with its own outbound queue. A writer task drains the queue,
+    # so a slow client only ever delays its own messages, never the room's.
+    def __init__(self, websocket, max_queue: int = SEND_QUEUE_SIZE, features: set[str] = None):
+        self.websocket = websocket
+        # Optional protocol extensions the client asked for when connecting
+        self.features = frozenset(features or ())
+        # Negotiated msgpack, every frame goes out as a binary one
+        self.binary = "msgpack" in self.features
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.writer: asyncio.Task = None
+        # Monotonic time of the last frame from the client, for the heartbeat
+        self.last_seen = time.monotonic()
+
+    def push(self, frame: str | bytes) -> bool:
+        # str goes out as a text frame, bytes (msgpack) as a binary one
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def send(self, frame: bytes) -> bool:
+        # frame comes from encode_message
+        return self.push(pack(frame) if self.binary else frame.decode())
+
+    def close(self):
+        # Flush whatever is already queued, then close the socket
+        if not self.push(None):
+            self.abort()
+
+    def abort(self):
+        # Drop pending frames and close the socket
+        if self.writer:
+            self.writer.cancel()
+
+    async def run_writer(self):
+        try:
+            while True:
+                frame = await self.queue.get()
+                if frame is None:
+                    # Ends the receive loop too, unless the client already left
+                    with suppress(Exception):
+                        await self.websocket.close()
+                    return
+                if isinstance(frame, bytes):
+                    await self.websocket.send_bytes(frame)
+                else:
+                    await self.websocket.send_text(frame)
+        except asyncio.CancelledError:
+            with suppress(Exception):
+                await self.websocket.close(code=1013)
+        except Exception:
+            # Socket is already gone, the receive loop will notice and clean up
+            pass
+
+
 class ConnectionManager:
-    def __init__(self):
+    def __init__(self, max_queue: int = SEND_QUEUE_SIZE, backplane=None, event_log=None):
         self.active_connections={}
+        self.max_queue = max_queue
+        # Stamps every frame with the room's event_seq so rejoining clients can replay
+        self.event_log = event_log
+        # Carries broadcasts to the room's sockets, see backplane.py
+        self.backplane = backplane or LocalBackplane()
+        self.backplane.bind(self.deliver)
+        self.writers = set()
+        # Rooms that opted in to coalescing, game_id -> window in seconds
+        self.coalesce_windows = {}
+        # Coalesced updates waiting for their window to close, game_id -> {key: build}
+        self.pending = {}
+        self.flush_tasks = {}
+        # Rooms whose actor is working through a batch of messages, their
+        # coalesced updates wait for release() even without a window
+        self.held = set()
+        # Called with {game_id: [player_id]} for clients dropped for falling
+        # behind on a broadcast, main.py announces them like the heartbeat's
+        self.on_drop = None
+        self.dropped = {}
+        self.drop_task: asyncio.Task = None
+
+    async def start(self):
+        await self.backplane.start()
 
-    async def connect(self, websocket, game_id: str, player_id: str):
+    async def stop(self):
+        await self.backplane.stop()
+
+    async def connect(self, websocket, game_id: str, player_id: str, features: set[str] = None):
         await websocket.accept()
-        
+
         if game_id not in self.active_connections:
             self.active_connections[game_id] = {}
-        
-        self.active_connections[game_id][player_id] = websocket
 
+        old = self.active_connections[game_id].get(player_id)
+        if old:
+            old.close()
 
-    def disconnect(self, game_id: str, player_id: str):
+        connection = ClientConnection(websocket, self.max_queue, features)
+        connection.writer = asyncio.create_task(connection.run_writer())
+        # The loop only keeps weak references to tasks
+        self.writers.add(connection.writer)
+        connection.writer.add_done_callback(self.writers.discard)
+        self.active_connections[game_id][player_id] = connection
+        return connection
+
+    def disconnect(self, game_id: str, player_id: str, websocket=None) -> bool:
+        # False if the connection was already gone (replaced, dropped or evicted)
+        removed = False
         if game_id in self.active_connections:
-            if player_id in self.active_connections[game_id]:
+            connection = self.active_connections[game_id].get(player_id)
+            # Ignore a stale socket if the player has already reconnected
+            if connection and (websocket is None or connection.websocket is websocket):
                 del self.active_connections[game_id][player_id]
-            
+                connection.close()
+                removed = True
+
             # Clean up empty games
             if not self.active_connections[game_id]:
                 del self.active_connections[game_id]
+        return removed
+
+    def close_game(self, game_id: str):
+        # Closes every socket of a game after their queued frames are sent
+        connections = self.active_connections.pop(game_id, {})
+        for connection in connections.values():
+            connection.close()
+        if self.event_log:
+            self.event_log.forget(game_id)
+        self.coalesce_windows.pop(game_id, None)
+        self.pending.pop(game_id, None)
+        self.held.discard(game_id)
+        self.dropped.pop(game_id, None)
+        task = self.flush_tasks.pop(game_id, None)
+        if task:
+            task.cancel()
+
+    def set_coalescing(self, game_id: str, window: float):
+        # window in seconds, 0 sends every update straight away
+        if window > 0:
+            self.coalesce_windows[game_id] = window
+        else:
+            self.coalesce_windows.pop(game_id, None)
+
+    async def broadcast_coalesced(self, game_id: str, key: str, build):
+        # build is a coroutine function that sends the update from the current
+        # game state. In a coalescing room only the latest build per key runs,
+        # once the window closes, so a burst of updates becomes one frame.
+        window = self.coalesce_windows.get(game_id)
+        if not window and game_id not in self.held:
+            await build()
+            return
+        self.pending.setdefault(game_id, {})[key] = build
+        if window and game_id not in self.flush_tasks:
+            self.flush_tasks[game_id] = asyncio.create_task(self.flush_later(game_id, window))
+
+    def hold(self, game_id: str):
+        self.held.add(game_id)
+
+    async def release(self, game_id: str):
+        # End of a batch, coalescing rooms still wait for their window
+        self.held.discard(game_id)
+        if game_id not in self.coalesce_windows:
+            await self.flush(game_id)
+
+    async def flush_later(self, game_id: str, window: float):
+        await asyncio.sleep(window)
+        self.flush_tasks.pop(game_id, None)
+        await self.flush(game_id)
+
+    async def flush(self, game_id: str):
+        pending = self.pending.pop(game_id, None)
+        if not pending:
+            return
+        task = self.flush_tasks.pop(game_id, None)
+        if task and task is not asyncio.current_task():
+            task.cancel()
+        for build in pending.values():
+            await build()
+
+    def drop(self, game_id: str, player_id: str) -> bool:
+        # Client fell too far behind: forget it and close its socket. False
+        # if it was already gone.
+        connections = self.active_connections.get(game_id)
+        if not connections or player_id not in connections:
+            return False
+        connection = connections.pop(player_id)
+        connection.abort()
+        if not connections:
+            del self.active_connections[game_id]
+        return True
+
+    def drop_lagging(self, game_id: str, player_id: str):
+        # A queue overflowed in deliver(). Its receive loop won't announce the
+        # player once the socket is gone, so on_drop does, after the broadcast.
+        if not self.drop(game_id, player_id) or self.on_drop is None:
+            return
+        self.dropped.setdefault(game_id, []).append(player_id)
+        if self.drop_task is None:
+            self.drop_task = asyncio.create_task(self.announce_dropped())
+
+    async def announce_dropped(self):
+        try:
+            # The announcements can overflow more queues
+            while self.dropped:
+                dropped, self.dropped = self.dropped, {}
+                await self.on_drop(dropped)
+        finally:
+            self.drop_task = None
+
+    def sweep(self, ping: str, timeout: float) -> dict[str, list[str]]:
+        # Pings every connection that negotiated the heartbeat and drops the
+        # ones silent for longer than timeout seconds, or too far behind to
+        # take the ping. Returns the dropped players by game.
+        dead = {}
+        cutoff = time.monotonic() - timeout
+        binary_ping = None
+        for game_id, connections in list(self.active_connections.items()):
+            for player_id, connection in list(connections.items()):
+                if "heartbeat" not in connection.features:
+                    continue
+                if connection.binary and binary_ping is None:
+                    binary_ping = pack(ping.encode())
+                if connection.last_seen < cutoff or not connection.push(binary_ping if connection.binary else ping):
+                    self.drop(game_id, player_id)
+                    dead.setdefault(game_id, []).append(player_id)
+        return dead
+
+    def deliver(self, game_id: str, player_id: str | None, frame: bytes, feature: str = None, fallback=None, overrides=None):
+        # Pushes a frame to this process's sockets, called by the backplane.
+        # player_id None means the whole room. With a feature, connections that
+        # negotiated it get frame and the rest get fallback, which may be a
+        # callable so it is only encoded if someone here needs it. Players in
+        # overrides (player_id -> frame) get their own frame instead.
+        connections = self.active_connections.get(game_id)
+        if not connections:
+            return
+        if player_id is not None:
+            connection = connections.get(player_id)
+            if connection and not connection.send(frame):
+                self.drop_lagging(game_id, player_id)
+            return
+        # Each variant (text or msgpack, frame or fallback) is made once here
+        # and the same object goes to every queue that wants it
+        start = time.perf_counter()
+        fanout = len(connections)
+        text = frame.decode()
+        binary = fallback_frame = fallback_text = fallback_binary = None
+        for player_id, connection in list(connections.items()):
+            if overrides and player_id in overrides:
+                pushed = connection.send(overrides[player_id])
+            elif feature is None or feature in connection.features:
+                if connection.binary:
+                    if binary is None:
+                        binary = pack(frame)
+                    pushed = connection.push(binary)
+                else:
+                    pushed = connection.push(text)
+            else:
+                if fallback_frame is None:
+                    fallback_frame = fallback() if callable(fallback) else fallback
+                if connection.binary:
+                    if fallback_binary is None:
+                        fallback_binary = pack(fallback_frame)
+                    pushed = connection.push(fallback_binary)
+                else:
+                    if fallback_text is None:
+                        fallback_text = fallback_frame.decode()
+                    pushed = connection.push(fallback_text)
+            if not pushed:
+                self.drop_lagging(game_id, player_id)
+        broadcast_fanout.observe(fanout)
+        broadcast_seconds.observe(time.perf_counter() - start)
+
+    async def broadcast_raw(self, game_id: str, frame: bytes):
+        # frame comes from encode_message
+        if game_id in self.pending:
+            # Anything coalesced happened before this frame, keep the order
+            await self.flush(game_id)
+        if self.event_log:
+            _, frame = self.event_log.append(game_id, None, frame)
+        await self.backplane.publish(game_id, None, frame)
+
+    async def broadcast_for_feature(self, game_id: str, feature: str, frame: bytes, fallback):
+        # Connections that negotiated feature get frame, the rest get the frame
+        # built by fallback()
+        if game_id in self.pending:
+            await self.flush(game_id)
+        if self.event_log:
+            # Both forms are kept for replay under one seq, the event builds
+            # and stamps the fallback at most once
+            _, frame, event = self.event_log.append_feature(game_id, feature, frame, fallback)
+            fallback = lambda: event.for_features(())
+        await self.backplane.publish(game_id, None, frame, feature, fallback)
+
+    async def broadcast_with_overrides(self, game_id: str, frame: bytes, overrides: dict[str, bytes]):
+        # The room gets frame, except the players in overrides who get their
+        # own. One event in the log, not one per player.
+        if game_id in self.pending:
+            await self.flush(game_id)
+        if self.event_log:
+            _, frame, overrides = self.event_log.append_overrides(game_id, frame, overrides)
+        await self.backplane.publish(game_id, None, frame, overrides=overrides)
+
+    async def send_raw(self, game_id: str, player_id: str, frame: bytes):
+        if game_id in self.pending:
+            await self.flush(game_id)
+        if self.event_log:
+            _, frame = self.event_log.append(game_id, player_id, frame)
+        await self.backplane.publish(game_id, player_id, frame)
 
     async def broadcast_to_game(self, game_id: str, message: dict):
-        if game_id in self.active_connections:
-            for websocket in self.active_connections[game_id].values():
-                await websocket.send_json(message)
+        await self.broadcast_raw(game_id, encode_message(message))
 
     async def send_to_player(self, game_id: str, player_id: str, message: dict):
-            if game_id in self.active_connections:
-                if player_id in self.active_connections[game_id]:
-                    websocket = self.active_connections[game_id][player_id]
-                    await websocket.send_json(message)
-
+        await self.send_raw(game_id, player_id, encode_message(message))
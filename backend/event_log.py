@@ -0,0 +1,295 @@
+import asyncio
+from contextlib import suppress
+import json
+import os
+import struct
+import sys
+import time
+from collections import deque
+
+# Every frame sent to a room gets the room's next event_seq and is kept in a
+# per-game ring, so a rejoining client can be sent just the events it missed.
+# Incoming commands are logged too. With EVENT_LOG set, records are also
+# appended to a file, fsynced in batches and compacted into snapshots.
+
+# Events kept per game, a client further behind gets a full state rebuild
+MAX_EVENTS = 64
+FLUSH_INTERVAL = 0.2
+# Rewrite the file from snapshots once it grows past this
+COMPACT_BYTES = 64 * 1024 * 1024
+
+# kind, payload length, seq, timestamp, game_id length, player_id length
+HEADER = struct.Struct(">BIQdHH")
+ROOM, PLAYER, COMMAND, SNAPSHOT, FALLBACK, OVERRIDE = 0, 1, 2, 3, 4, 5
+
+
+def stamp(frame: bytes, seq: int) -> bytes:
+    # Adds "event_seq" to an encoded message without re-encoding it
+    return b'{"event_seq":%d,' % seq + frame[1:]
+
+
+class FeatureFrame:
+    # A room event sent in two forms: frame to clients that negotiated
+    # feature, fallback() to the rest. fallback is only built if a replay
+    # needs it (or the file is written), and then only once.
+    __slots__ = ("feature", "frame", "fallback", "built")
+
+    def __init__(self, feature: str, frame: bytes, fallback):
+        self.feature = feature
+        self.frame = frame
+        self.fallback = fallback
+        self.built = None
+
+    def for_features(self, features) -> bytes:
+        if self.feature in features:
+            return self.frame
+        if self.built is None:
+            self.built = self.fallback()
+        return self.built
+
+
+class PlayerFrames:
+    # A room event where a few players get their own frame instead of the
+    # room's (the impostor's session_started), kept as one event however
+    # big the room is
+    __slots__ = ("frame", "overrides")
+
+    def __init__(self, frame: bytes, overrides: dict[str, bytes]):
+        self.frame = frame
+        self.overrides = overrides
+
+    def for_player(self, player_id: str) -> bytes:
+        return self.overrides.get(player_id, self.frame)
+
+
+def pack_record(kind: int, seq: int, game_id: str, player_id: str | None, payload: bytes) -> bytes:
+    game = game_id.encode()
+    player = (player_id or "").encode()
+    return HEADER.pack(kind, len(payload), seq, time.time(), len(game), len(player)) + game + player + payload
+
+
+def pack_feature_records(seq: int, game_id: str, event: FeatureFrame) -> bytes:
+    # The feature frame as a room record, then its fallback as a FALLBACK
+    # record with the feature name where a player id would go
+    return (pack_record(ROOM, seq, game_id, None, event.frame)
+            + pack_record(FALLBACK, seq, game_id, event.feature, event.for_features(())))
+
+
+def pack_override_records(seq: int, game_id: str, event: PlayerFrames) -> bytes:
+    # The room's frame, then an OVERRIDE record per player with their own
+    return (pack_record(ROOM, seq, game_id, None, event.frame)
+            + b"".join(pack_record(OVERRIDE, seq, game_id, player_id, frame) for player_id, frame in event.overrides.items()))
+
+
+def read_records(path: str):
+    # Yields (kind, seq, timestamp, game_id, player_id, payload), stopping at a
+    # record cut short by a crash
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = 0
+    while offset + HEADER.size <= len(data):
+        kind, size, seq, timestamp, game_len, player_len = HEADER.unpack_from(data, offset)
+        start = offset + HEADER.size
+        end = start + game_len + player_len + size
+        if end > len(data):
+            break
+        game_id = data[start:start + game_len].decode()
+        player_id = data[start + game_len:start + game_len + player_len].decode() or None
+        yield kind, seq, timestamp, game_id, player_id, data[start + game_len + player_len:end]
+        offset = end
+
+
+class EventLog:
+    def __init__(self, path: str = None, max_events: int = MAX_EVENTS):
+        self.path = path
+        self.max_events = max_events
+        self.seqs: dict[str, int] = {}
+        # game_id -> deque of (seq, player_id or None, stamped frame)
+        self.events: dict[str, deque] = {}
+        self.buffer = bytearray()
+        self.file = None
+        self.flush_task: asyncio.Task = None
+        self.snapshot_games = None
+
+    def append(self, game_id: str, player_id: str | None, frame: bytes) -> tuple[int, bytes]:
+        # Frame for the room (player_id None) or one player, returns its seq
+        # and the frame stamped with it
+        seq = self.seqs.get(game_id, 0) + 1
+        self.seqs[game_id] = seq
+        stamped = stamp(frame, seq)
+        events = self.events.get(game_id)
+        if events is None:
+            events = self.events[game_id] = deque(maxlen=self.max_events)
+        events.append((seq, player_id, stamped))
+        if self.path:
+            self.buffer += pack_record(ROOM if player_id is None else PLAYER, seq, game_id, player_id, stamped)
+        return seq, stamped
+
+    def command(self, game_id: str, player_id: str, message: dict):
+        # Incoming messages are only written to the file, for debugging
+        if self.path:
+            payload = json.dumps(message, separators=(",", ":")).encode()
+            self.buffer += pack_record(COMMAND, self.seqs.get(game_id, 0), game_id, player_id, payload)
+
+    def append_feature(self, game_id: str, feature: str, frame: bytes, fallback) -> tuple[int, bytes, FeatureFrame]:
+        # Room frame with a fallback form, see FeatureFrame. Both share one
+        # seq, the returned FeatureFrame gives the stamped fallback.
+        seq = self.seqs.get(game_id, 0) + 1
+        self.seqs[game_id] = seq
+        stamped = stamp(frame, seq)
+        event = FeatureFrame(feature, stamped, lambda: stamp(fallback(), seq))
+        events = self.events.get(game_id)
+        if events is None:
+            events = self.events[game_id] = deque(maxlen=self.max_events)
+        events.append((seq, None, event))
+        if self.path:
+            self.buffer += pack_feature_records(seq, game_id, event)
+        return seq, stamped, event
+
+    def append_overrides(self, game_id: str, frame: bytes, overrides: dict[str, bytes]) -> tuple[int, bytes, dict[str, bytes]]:
+        # Room frame where the players in overrides get their own frame, see
+        # PlayerFrames. Returns the seq and every frame stamped with it.
+        seq = self.seqs.get(game_id, 0) + 1
+        self.seqs[game_id] = seq
+        event = PlayerFrames(stamp(frame, seq), {player_id: stamp(own, seq) for player_id, own in overrides.items()})
+        events = self.events.get(game_id)
+        if events is None:
+            events = self.events[game_id] = deque(maxlen=self.max_events)
+        events.append((seq, None, event))
+        if self.path:
+            self.buffer += pack_override_records(seq, game_id, event)
+        return seq, event.frame, event.overrides
+
+    def current_seq(self, game_id: str) -> int:
+        return self.seqs.get(game_id, 0)
+
+    def since(self, game_id: str, player_id: str, last_seq: int, features=frozenset()) -> list[bytes] | None:
+        # Frames this player missed after last_seq, None if they are no longer
+        # kept. features are the ones the client negotiated.
+        events = self.events.get(game_id, ())
+        if last_seq >= self.current_seq(game_id):
+            return []
+        if not events or events[0][0] > last_seq + 1:
+            return None
+        missed = []
+        for seq, target, frame in events:
+            if seq <= last_seq or target not in (None, player_id):
+                continue
+            if isinstance(frame, FeatureFrame):
+                frame = frame.for_features(features)
+            elif isinstance(frame, PlayerFrames):
+                frame = frame.for_player(player_id)
+            missed.append(frame)
+        return missed
+
+    def forget(self, game_id: str):
+        self.seqs.pop(game_id, None)
+        self.events.pop(game_id, None)
+
+    def load(self):
+        # Rebuilds seqs and recent events from the file after a restart
+        if not self.path or not os.path.exists(self.path):
+            return
+        for kind, seq, _, game_id, player_id, payload in read_records(self.path):
+            if kind == SNAPSHOT:
+                self.seqs[game_id] = seq
+                self.events[game_id] = deque(maxlen=self.max_events)
+            elif kind in (ROOM, PLAYER):
+                self.seqs[game_id] = seq
+                self.events.setdefault(game_id, deque(maxlen=self.max_events)).append((seq, player_id, payload))
+            elif kind == FALLBACK and self.events.get(game_id) and self.events[game_id][-1][0] == seq:
+                # Follows its feature frame, which becomes a FeatureFrame again
+                frame = self.events[game_id][-1][2]
+                self.events[game_id][-1] = (seq, None, FeatureFrame(player_id, frame, lambda payload=payload: payload))
+            elif kind == OVERRIDE and self.events.get(game_id) and self.events[game_id][-1][0] == seq:
+                # Follows its room frame, like FALLBACK
+                frame = self.events[game_id][-1][2]
+                if not isinstance(frame, PlayerFrames):
+                    frame = PlayerFrames(frame, {})
+                    self.events[game_id][-1] = (seq, None, frame)
+                frame.overrides[player_id] = payload
+
+    async def start(self, snapshot_games=None):
+        # snapshot_games() returns {game_id: snapshot dict} for compaction
+        if not self.path:
+            return
+        self.snapshot_games = snapshot_games
+        self.file = open(self.path, "ab")
+        self.flush_task = asyncio.create_task(self.flush_loop())
+
+    async def stop(self):
+        if self.flush_task:
+            self.flush_task.cancel()
+            # Let a write already in its thread finish before the final flush
+            with suppress(asyncio.CancelledError):
+                await self.flush_task
+        if self.file:
+            await self.flush()
+            self.file.close()
+            self.file = None
+
+    async def flush_loop(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                await self.flush()
+                if self.file.tell() > COMPACT_BYTES and self.snapshot_games:
+                    await self.compact()
+            except Exception as e:
+                print(f"Writing the event log failed: {e!r}")
+
+    async def flush(self):
+        # One write and one fsync for everything logged since the last flush
+        if not self.buffer:
+            return
+        data, self.buffer = bytes(self.buffer), bytearray()
+        await asyncio.to_thread(self.write, data)
+
+    def write(self, data: bytes):
+        self.file.write(data)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    async def compact(self):
+        # Replaces the file with one snapshot per live game plus the events
+        # still kept for it. Deleted games drop out entirely. Records are
+        # built here on the loop, the rewrite happens in a thread.
+        snapshots = self.snapshot_games()
+        for game_id in list(self.events):
+            if game_id not in snapshots:
+                self.forget(game_id)
+        records = []
+        for game_id, snapshot in snapshots.items():
+            events = self.events.get(game_id, ())
+            base = events[0][0] - 1 if events else self.current_seq(game_id)
+            records.append(pack_record(SNAPSHOT, base, game_id, None, json.dumps(snapshot, separators=(",", ":")).encode()))
+            for seq, player_id, frame in events:
+                if isinstance(frame, FeatureFrame):
+                    records.append(pack_feature_records(seq, game_id, frame))
+                elif isinstance(frame, PlayerFrames):
+                    records.append(pack_override_records(seq, game_id, frame))
+                else:
+                    records.append(pack_record(ROOM if player_id is None else PLAYER, seq, game_id, player_id, frame))
+        self.file.close()
+        await asyncio.to_thread(self.rewrite, b"".join(records))
+        self.file = open(self.path, "ab")
+
+    def rewrite(self, data: bytes):
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+event_log = EventLog(os.environ.get("EVENT_LOG"))
+
+
+if __name__ == "__main__":
+    # python event_log.py events.log [GAME_ID] prints a game's timeline
+    names = {ROOM: "room", PLAYER: "player", COMMAND: "command", SNAPSHOT: "snapshot", FALLBACK: "fallback", OVERRIDE: "override"}
+    for kind, seq, timestamp, game_id, player_id, payload in read_records(sys.argv[1]):
+        if len(sys.argv) > 2 and game_id != sys.argv[2]:
+            continue
+        print(f"{timestamp:.3f} {game_id} #{seq} {names[kind]} {player_id or '-'} {payload.decode()}")
@@ -0,0 +1,111 @@
+import asyncio
+
+# Every room gets one task that works through its messages in arrival order,
+# so handlers for the same game never interleave at an await. Messages that
+# pile up while a handler is busy are handled as one batch, and the
+# coalesced broadcasts they cause (ready counts, vote updates) go out once
+# at the end of the batch instead of once per message.
+
+INBOX_SIZE = 256
+STOP = object()
+
+
+class GameActor:
+    def __init__(self, game_id: str, handle, manager, max_inbox: int = INBOX_SIZE):
+        self.game_id = game_id
+        self.handle = handle
+        self.manager = manager
+        # Bounded, so a flooding socket waits on put() instead of growing it
+        self.inbox = asyncio.Queue(max_inbox)
+        self.task: asyncio.Task = None
+
+    async def run(self):
+        while True:
+            item = await self.inbox.get()
+            if item is STOP:
+                return
+            self.manager.hold(self.game_id)
+            try:
+                while item is not None:
+                    player_id, message = item
+                    try:
+                        if callable(message):
+                            await message()
+                        else:
+                            await self.handle(self.game_id, player_id, message)
+                    except Exception as e:
+                        print(f"Handling {message!r} in game {self.game_id} failed: {e!r}")
+                    item = None if self.inbox.empty() else self.inbox.get_nowait()
+                    if item is STOP:
+                        return
+            finally:
+                await self.manager.release(self.game_id)
+
+
+class ActorRegistry:
+    def __init__(self, handle, manager, exists=lambda game_id: True, max_inbox: int = INBOX_SIZE):
+        # handle(game_id, player_id, message) is main.handle_message, and
+        # exists(game_id) says whether the game is still live
+        self.handle = handle
+        self.exists = exists
+        self.manager = manager
+        self.max_inbox = max_inbox
+        self.actors: dict[str, GameActor] = {}
+
+    def actor_for(self, game_id: str) -> GameActor | None:
+        # None if the game doesn't exist (any more), rather than starting an
+        # actor nobody would stop
+        actor = self.actors.get(game_id)
+        if actor is None or actor.task.done():
+            if not self.exists(game_id):
+                return None
+            actor = self.actors[game_id] = GameActor(game_id, self.handle, self.manager, self.max_inbox)
+            actor.task = asyncio.create_task(actor.run())
+        return actor
+
+    async def submit(self, game_id: str, player_id: str, message) -> bool:
+        # False if the game is gone and the message was dropped
+        actor = self.actor_for(game_id)
+        if actor is None:
+            return False
+        await actor.inbox.put((player_id, message))
+        return True
+
+    async def call(self, game_id: str, fn) -> bool:
+        # Runs the coroutine function fn on the game's actor, in turn with its
+        # messages. For server-side events like timers.
+        return await self.submit(game_id, None, fn)
+
+    async def ask(self, game_id: str, fn):
+        # Like call, but waits for fn to run and returns its result, for the
+        # HTTP endpoints. None if the game is gone or its actor stopped
+        # before getting to fn.
+        actor = self.actor_for(game_id)
+        if actor is None:
+            return None
+        done = asyncio.get_running_loop().create_future()
+
+        async def run():
+            try:
+                done.set_result(await fn())
+            except Exception as e:
+                done.set_exception(e)
+
+        await actor.inbox.put((None, run))
+        await asyncio.wait([done, actor.task], return_when=asyncio.FIRST_COMPLETED)
+        return done.result() if done.done() else None
+
+    def stop_game(self, game_id: str):
+        # Lets the actor finish what it is doing, then ends its task. Safe
+        # to call from inside one of its own handlers.
+        actor = self.actors.pop(game_id, None)
+        if actor:
+            try:
+                actor.inbox.put_nowait(STOP)
+            except asyncio.QueueFull:
+                actor.task.cancel()
+
+    async def stop(self):
+        for actor in self.actors.values():
+            actor.task.cancel()
+        self.actors.clear()
@@ -1,15 +1,27 @@
 from models import GamePlay, Player, SecretWordSession
-from claude_service import generate_secret_word 
+from word_pool import category_pool
+from word_bank import default_words
+from sharding import owns
+from game_store import create_store
 import random
 import string
-import json
+import heapq
 import os
-from datetime import datetime
+import time
 
 
 active_games = {}
 active_players = {}
 
+# Snapshots games off the hot path, see game_store.py. Set GAME_STORE to a
+# SQLite file to keep live games across restarts
+store = create_store(os.environ.get("GAME_STORE"))
+
+# (last_activity, game_id) for every live game, oldest on top. Touching a game
+# only updates last_activity, an entry that turns out stale when it reaches
+# the top is pushed back with the game's real last_activity.
+expiry_heap = []
+
 def create_game(host_id, max_round, clue_timer, secret_category):
     game_id = generate_game_id()
     game = GamePlay(game_id, host_id, max_round, clue_timer, secret_category)
@@ -20,12 +32,15 @@ def create_game(host_id, max_round, clue_timer, secret_category):
         game.addNewPlayer(host)
     
     active_games[game_id] = game
+    heapq.heappush(expiry_heap, (game.last_activity, game_id))
+    store.mark_dirty(game_id)
     return game_id
 
 def register_player(name : str) -> str:
      player_id = generate_player_id()
      player = Player(name, player_id)
      active_players[player_id] = player
+     store.mark_player(player_id)
      return player_id
 
 def generate_game_id() -> str:
@@ -33,7 +48,8 @@ def generate_game_id() -> str:
     safe_chars = "ABCDEFGHJKMNPQRSTUVWXYZ23456789"
     while True:
         game_id = ''.join(random.choices(safe_chars, k=6))
-        if game_id not in active_games:
+        # When sharded, only hand out IDs that hash to this worker
+        if game_id not in active_games and owns(game_id):
             return game_id
 
 def generate_player_id():
@@ -41,53 +57,67 @@ def generate_player_id():
     safe_chars = "ABCDEFGHJKMNPQRSTUVWXYZ23456789"
     while True:
         player_id = ''.join(random.choices(safe_chars, k=6))
-        if player_id not in active_players:
+        if player_id not in active_players and owns(player_id):
             return player_id
 
-def join_game(player_id : str, game_id:str):
+def join_game(player_id : str, game_id:str, name: str = ""):
     try:
         game = active_games[game_id] 
     except KeyError:
          print(f"The game was not found. Please confirm you have the correct game id: {game_id}, and try again")
          return False
-    player = active_players[player_id]
+    player = active_players.get(player_id)
+    if not player:
+        # Registered on another worker, the router passes the name along
+        if not name:
+            return False
+        player = Player(name, player_id)
+        active_players[player_id] = player
     
     # Prevent duplicate joins
-    for p in game.loPlayers:
-        if p.id == player_id:
-            return True  # Already in the game, just return success
+    if game.getPlayer(player_id):
+        return True  # Already in the game, just return success
     
     game.addNewPlayer(player)
+    store.mark_dirty(game_id)
     print(f"Player {player_id} joined game {game_id}")
     return True
 
-def start_game(game_id: str) -> bool:
+async def fetch_words(category: str, count: int, used_words: list[str]) -> list[str]:
+    # Custom categories come from the shared Claude word pool, anything that fails or times out gets default words
+    if category:
+        try:
+            words = await category_pool.take(category, count, used_words)
+            if words:
+                return words
+        except Exception as e:
+            print(f"Word generation failed for category '{category}', using default words: {e!r}")
+    return load_default_words(count, used_words)
+
+async def start_game(game_id: str) -> bool:
     try:
         currentgame = active_games[game_id]
         currentgame.impostorSchedule = createImpostorSchedule(currentgame.loPlayers, currentgame.maxRound)
         
-        if currentgame.secretCategory:
-            words = generate_secret_word(currentgame.secretCategory, currentgame.maxRound, currentgame.wordsUsed)
-        else:
-            words = load_default_words(currentgame.maxRound, currentgame.wordsUsed)
+        words = await fetch_words(currentgame.secretCategory, currentgame.maxRound, currentgame.wordsUsed)
         
         currentgame.fillAvailableWords(words)
+        store.mark_dirty(game_id)
         return True
     except KeyError:
         return False
     
-def start_session(game_id):
+async def start_session(game_id):
     try:
         current_game = active_games[game_id]
         if not current_game.wordsAvailable:
-            if current_game.secretCategory:
-                current_game.wordsAvailable = generate_secret_word(current_game.secretCategory, current_game.maxRound, current_game.wordsUsed)
-            else:
-                current_game.wordsAvailable = load_default_words(current_game.maxRound, current_game.wordsUsed)
+            current_game.wordsAvailable = await fetch_words(current_game.secretCategory, current_game.maxRound, current_game.wordsUsed)
         impostor = current_game.impostorSchedule.pop(0)
         currentWord = current_game.giveWord()
         session = SecretWordSession(current_game.loPlayers, currentWord, impostor)
         current_game.currentSession = session
+        current_game.updateRoundMode()
+        store.mark_dirty(game_id)
         return True
     except KeyError:
         return False
@@ -116,11 +146,12 @@ def submit_vote(game_id: str, player_id: str, vote_for_id: str) -> bool:
     try:
         game = active_games[game_id]
         # Find the player being voted for and increment their votes
-        for player in game.loPlayers:
-            if player.id == vote_for_id:
-                player.votes += 1
-                return True
-        return False  # Player not found
+        player = game.getPlayer(vote_for_id)
+        if not player:
+            return False  # Player not found
+        game.changeVotes(player, 1)
+        store.mark_dirty(game_id)
+        return True
     except KeyError:
         return False
 
@@ -130,12 +161,7 @@ def end_session(game_id: str) -> dict:
         session = game.currentSession
         
         # Find player with most votes
-        most_votes = 0
-        voted_out = None
-        for player in game.loPlayers:
-            if player.votes > most_votes:
-                most_votes = player.votes
-                voted_out = player
+        voted_out = game.voteLeader()
         
         # Check if impostor was caught
         impostor = session.currentImpostor
@@ -152,8 +178,8 @@ def end_session(game_id: str) -> dict:
             impostor.points += 1
         
         # Reset votes for next session
-        for player in game.loPlayers:
-            player.votes = 0
+        game.resetVotes()
+        store.mark_dirty(game_id)
         
         return {
             "impostor_caught": impostor_caught,
@@ -164,19 +190,7 @@ def end_session(game_id: str) -> dict:
         return None
 
 def load_default_words(count: int, used_words: list[str]) -> list[str]:
-    words_path = os.path.join(os.path.dirname(__file__), "words.json")
-    with open(words_path, "r") as f:
-        word_data = json.load(f)
-    
-    # Flatten all categories into one list
-    all_words = []
-    for category_words in word_data.values():
-        all_words.extend(category_words)
-    
-    # Remove any already used words
-    available = [w for w in all_words if w not in used_words]
-    
-    return random.sample(available, min(count, len(available)))
+    return default_words.sample(count, used_words)
 
 def quit_game(game_id: str, player_id: str) -> dict:
     game = active_games.get(game_id)
@@ -184,20 +198,18 @@ def quit_game(game_id: str, player_id: str) -> dict:
         return {"status": "game_not_found"}
     
     # Remove player from game
-    player_to_remove = None
-    for p in game.loPlayers:
-        if p.id == player_id:
-            player_to_remove = p
-            break
+    player_to_remove = game.getPlayer(player_id)
     
     if not player_to_remove:
         return {"status": "player_not_found"}
     
-    game.loPlayers.remove(player_to_remove)
+    game.removePlayer(player_to_remove)
     
     # Remove from active players
     if player_id in active_players:
         del active_players[player_id]
+    store.mark_player(player_id)
+    store.mark_dirty(game_id)
     
     # Remove from impostor schedule if present
     game.impostorSchedule = [p for p in game.impostorSchedule if p.id != player_id]
@@ -221,25 +233,50 @@ def quit_game(game_id: str, player_id: str) -> dict:
     }
 
 def cleanup_inactive_games(timeout_minutes: int = 5) -> list[str]:
-    now = datetime.now()
+    timeout = timeout_minutes * 60
+    now = time.monotonic()
     games_to_delete = []
     
-    for game_id, game in list(active_games.items()):
-        minutes_inactive = (now - game.last_activity).total_seconds() / 60
-        if minutes_inactive >= timeout_minutes:
-            # Remove all players from active_players
-            for player in game.loPlayers:
-                if player.id in active_players:
-                    del active_players[player.id]
-            del active_games[game_id]
-            games_to_delete.append(game_id)
+    # Only games whose heap entry is due get looked at, idle or not
+    while expiry_heap and expiry_heap[0][0] + timeout <= now:
+        _, game_id = heapq.heappop(expiry_heap)
+        game = active_games.get(game_id)
+        if not game:
+            continue  # Already gone (everyone quit)
+        if game.last_activity + timeout > now:
+            heapq.heappush(expiry_heap, (game.last_activity, game_id))
+            continue
+        # Remove all players from active_players
+        for player in game.loPlayers:
+            if player.id in active_players:
+                del active_players[player.id]
+            store.mark_player(player.id)
+        del active_games[game_id]
+        store.mark_dirty(game_id)
+        games_to_delete.append(game_id)
     
     return games_to_delete
 
+def next_cleanup_delay(timeout_minutes: int = 5) -> float:
+    # Seconds until the oldest game could time out
+    if not expiry_heap:
+        return timeout_minutes * 60
+    return max(expiry_heap[0][0] + timeout_minutes * 60 - time.monotonic(), 0)
+
+def restore_games():
+    # Bulk-loads whatever the store saved before the last shutdown or crash
+    games, players = store.load()
+    active_games.update(games)
+    active_players.update(players)
+    for game_id, game in games.items():
+        heapq.heappush(expiry_heap, (game.last_activity, game_id))
+    if games:
+        print(f"Restored {len(games)} games and {len(players)} players")
+
 def update_activity(game_id: str):
     game = active_games.get(game_id)
     if game:
-        game.last_activity = datetime.now()
+        game.last_activity = time.monotonic()
 
 def rejoin_game(game_id: str, player_id: str) -> dict:
     game = active_games.get(game_id)
@@ -247,11 +284,7 @@ def rejoin_game(game_id: str, player_id: str) -> dict:
         return {"status": "game_not_found"}
     
     # Check if player is still in the game
-    player = None
-    for p in game.loPlayers:
-        if p.id == player_id:
-            player = p
-            break
+    player = game.getPlayer(player_id)
     
     if not player:
         return {"status": "player_not_found"}
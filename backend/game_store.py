@@ -0,0 +1,230 @@
+from abc import ABC, abstractmethod
+import asyncio
+from contextlib import suppress
+import json
+import sqlite3
+
+from models import GamePhase, GamePlay, Player, SecretWordSession
+
+# How often dirty games are snapshotted and written, in seconds
+FLUSH_INTERVAL = 0.5
+
+PLAYER_FIELDS = ["id", "name", "imposter", "votes", "ready_to_start", "ready_to_vote", "points", "has_voted", "voted_for_id"]
+
+
+def snapshot_player(player: Player) -> dict:
+    return {field: getattr(player, field) for field in PLAYER_FIELDS}
+
+
+def restore_player(data: dict) -> Player:
+    player = Player(data["name"], data["id"])
+    for field in PLAYER_FIELDS:
+        setattr(player, field, data[field])
+    return player
+
+
+def snapshot_game(game: GamePlay) -> dict:
+    game.syncPlayers()
+    session = game.currentSession
+    return {
+        "gameID": game.gameID,
+        "hostID": game.hostID,
+        "maxRound": game.maxRound,
+        "clueTimer": game.clueTimer,
+        "secretCategory": game.secretCategory,
+        "roundTimer": game.roundTimer,
+        "phase": game.phase.value,
+        "players": [snapshot_player(p) for p in game.loPlayers],
+        "impostorSchedule": [p.id for p in game.impostorSchedule],
+        "wordsAvailable": game.wordsAvailable,
+        "wordsUsed": game.wordsUsed,
+        "voteSeq": game.voteSeq,
+        "session": session and {
+            "playOrder": [p.id for p in session.playOrder],
+            "secretWord": session.secretWord,
+            "currentTurnIndex": session.currentTurnIndex,
+            "currentImpostor": session.currentImpostor.id,
+        },
+    }
+
+
+def restore_game(data: dict, players: dict[str, Player]) -> GamePlay:
+    # players collects every restored Player so games and active_players share them
+    game = GamePlay(data["gameID"], data["hostID"], data["maxRound"], data["clueTimer"], data["secretCategory"])
+    game.roundTimer = data["roundTimer"]
+    game.phase = GamePhase(data["phase"])
+    for player_data in data["players"]:
+        player = restore_player(player_data)
+        players[player.id] = player
+        game.addNewPlayer(player)
+    game.impostorSchedule = [players[pid] for pid in data["impostorSchedule"] if pid in players]
+    game.wordsAvailable = data["wordsAvailable"]
+    game.wordsUsed = data["wordsUsed"]
+    game.voteSeq = data["voteSeq"]
+
+    session_data = data["session"]
+    if session_data:
+        play_order = [players[pid] for pid in session_data["playOrder"] if pid in players]
+        impostor = players.get(session_data["currentImpostor"])
+        session = SecretWordSession(play_order, session_data["secretWord"], impostor)
+        session.playOrder = play_order
+        session.currentTurnIndex = min(session_data["currentTurnIndex"], max(len(play_order) - 1, 0))
+        game.currentSession = session
+    game.updateRoundMode()
+    return game
+
+
+class GameStore(ABC):
+    # Handlers only mark games dirty, which is a set insert. A background task
+    # snapshots whatever changed every FLUSH_INTERVAL and hands the whole batch
+    # to write_batch, so persistence never runs inside a message handler.
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self.games: dict[str, GamePlay] = None
+        self.players: dict[str, Player] = None
+        self.dirty_games = set()
+        self.dirty_players = set()
+        self.flush_task: asyncio.Task = None
+
+    def mark_dirty(self, game_id: str):
+        self.dirty_games.add(game_id)
+
+    def mark_player(self, player_id: str):
+        self.dirty_players.add(player_id)
+
+    def load(self) -> tuple[dict[str, GamePlay], dict[str, Player]]:
+        # Rebuilds every stored game and player, for startup
+        games_data, players_data = self.read_all()
+        players = {}
+        games = {}
+        for data in games_data:
+            game = restore_game(data, players)
+            games[game.gameID] = game
+        for data in players_data:
+            if data["id"] not in players:
+                players[data["id"]] = restore_player(data)
+        return games, players
+
+    async def start(self, games: dict[str, GamePlay], players: dict[str, Player]):
+        # games and players are the live dicts from game_manager
+        self.games, self.players = games, players
+        self.flush_task = asyncio.create_task(self.flush_loop())
+
+    async def stop(self):
+        if self.flush_task:
+            self.flush_task.cancel()
+            # Let a write already in its thread finish before the final flush
+            with suppress(asyncio.CancelledError):
+                await self.flush_task
+        await self.flush()
+
+    async def flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Saving games failed: {e!r}")
+
+    async def flush(self):
+        if self.games is None or not (self.dirty_games or self.dirty_players):
+            return
+        dirty_games, self.dirty_games = self.dirty_games, set()
+        dirty_players, self.dirty_players = self.dirty_players, set()
+
+        # Snapshot on the loop so state can't change halfway, write in a thread.
+        # None means the game or player is gone and its row should be deleted.
+        games = {}
+        for game_id in dirty_games:
+            game = self.games.get(game_id)
+            games[game_id] = json.dumps(snapshot_game(game), separators=(",", ":")) if game else None
+        players = {}
+        for player_id in dirty_players:
+            player = self.players.get(player_id)
+            players[player_id] = json.dumps(snapshot_player(player), separators=(",", ":")) if player else None
+        await asyncio.to_thread(self.write_batch, games, players)
+
+    @abstractmethod
+    def read_all(self) -> tuple[list[dict], list[dict]]:
+        ...
+
+    @abstractmethod
+    def write_batch(self, games: dict[str, str | None], players: dict[str, str | None]):
+        ...
+
+
+class NullGameStore(GameStore):
+    # Keeps nothing, the default when no file is configured. Snapshots held in
+    # the same process wouldn't survive the crash they are meant for, so
+    # marking is a no-op and there is no flush task at all.
+    def mark_dirty(self, game_id: str):
+        pass
+
+    def mark_player(self, player_id: str):
+        pass
+
+    async def start(self, games, players):
+        pass
+
+    async def stop(self):
+        pass
+
+    def read_all(self):
+        return [], []
+
+    def write_batch(self, games, players):
+        pass
+
+
+class MemoryGameStore(GameStore):
+    # Keeps the snapshots in this process only, for tests
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL):
+        super().__init__(flush_interval)
+        self.saved_games = {}
+        self.saved_players = {}
+
+    def read_all(self):
+        return ([json.loads(v) for v in self.saved_games.values()],
+                [json.loads(v) for v in self.saved_players.values()])
+
+    def write_batch(self, games, players):
+        for saved, batch in ((self.saved_games, games), (self.saved_players, players)):
+            for key, value in batch.items():
+                if value is None:
+                    saved.pop(key, None)
+                else:
+                    saved[key] = value
+
+
+class SQLiteGameStore(GameStore):
+    # One row per game and per player in a WAL-mode database, so a restart or
+    # deploy picks up every live room where it left off
+    def __init__(self, path: str, flush_interval: float = FLUSH_INTERVAL):
+        super().__init__(flush_interval)
+        # Only one flush runs at a time, so the connection is never shared
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS games (game_id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS players (player_id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+        self.db.commit()
+
+    def read_all(self):
+        games = [json.loads(row[0]) for row in self.db.execute("SELECT data FROM games")]
+        players = [json.loads(row[0]) for row in self.db.execute("SELECT data FROM players")]
+        return games, players
+
+    def write_batch(self, games, players):
+        with self.db:
+            for table, key, batch in (("games", "game_id", games), ("players", "player_id", players)):
+                self.db.executemany(f"INSERT OR REPLACE INTO {table} ({key}, data) VALUES (?, ?)",
+                                    [(k, v) for k, v in batch.items() if v is not None])
+                self.db.executemany(f"DELETE FROM {table} WHERE {key} = ?",
+                                    [(k,) for k, v in batch.items() if v is None])
+
+
+def create_store(path: str = None) -> GameStore:
+    # GAME_STORE=games.db keeps games across restarts, otherwise nothing is kept
+    if path:
+        return SQLiteGameStore(path)
+    return NullGameStore()
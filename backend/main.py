@@ -3,16 +3,46 @@ from contextlib import asynccontextmanager
 from models import GamePhase
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware 
-from game_manager import register_player, create_game,join_game, start_game, start_session, active_games, submit_vote, end_session, quit_game, cleanup_inactive_games, update_activity, rejoin_game
-from connection_manager import ConnectionManager
+from game_manager import register_player, create_game,join_game, start_game, start_session, active_games, active_players, submit_vote, end_session, quit_game, cleanup_inactive_games, next_cleanup_delay, update_activity, rejoin_game, restore_games, store
+from connection_manager import ConnectionManager, encode_message
+from word_bank import default_words
+from event_log import event_log
+from game_store import snapshot_game
+from game_actor import ActorRegistry
+from scheduler import scheduler
+from metrics import Counter, Gauge, Histogram, cleanup_sweep_seconds, render, timer
+from word_pool import category_pool
+from rate_limit import limiter
+from protocol import BINARY_FRAMES, Command, Field, FrameTooLarge, ProtocolError, load, parse, route, routes
+from fastapi.responses import PlainTextResponse
+import json
 import os
+import time
+from contextlib import suppress
 
 
 @asynccontextmanager
 async def lifespan(app):
+    default_words.load()
+    restore_games()
+    event_log.load()
+    await store.start(active_games, active_players)
+    await event_log.start(lambda: {game_id: snapshot_game(game) for game_id, game in active_games.items()})
+    await manager.start()
+    await scheduler.start()
+    if HEARTBEAT_INTERVAL > 0:
+        scheduler.schedule("heartbeat", HEARTBEAT_INTERVAL, heartbeat_sweep)
+    # Restored games that were mid-turn get their turn deadline back
+    for game_id in active_games:
+        start_turn_timer(game_id)
     task = asyncio.create_task(cleanup_loop())
     yield
     task.cancel()
+    await scheduler.stop()
+    await actors.stop()
+    await manager.stop()
+    await event_log.stop()
+    await store.stop()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -25,7 +55,41 @@ app.add_middleware(
 )
 
 
-manager = ConnectionManager()
+# Running several workers? Put router.py in front so each room stays on one
+manager = ConnectionManager(event_log=event_log)
+
+# Vote changes not yet sent in a vote_update, per game
+pending_votes = {}
+
+# Largest settings a host can pick, the same limits the Flutter client
+# checks. max_round sizes the impostor schedule and the word fetch.
+MAX_ROUNDS = 100
+MAX_CLUE_TIMER = 600
+
+# Seconds past clue_timer before the server moves the turn on, so a player
+# finishing right at 0 on a slow connection isn't cut off
+TURN_GRACE_SECONDS = float(os.environ.get("TURN_GRACE_SECONDS", 1))
+# game_id -> number of the game's current turn deadline, a timeout for an
+# older one is ignored
+turn_deadlines = {}
+
+# Clients connecting with ?heartbeat=true get a ping every HEARTBEAT_INTERVAL
+# seconds and must answer (or send anything) within HEARTBEAT_TIMEOUT, or
+# their socket is closed. 0 turns the pings off.
+HEARTBEAT_INTERVAL = float(os.environ.get("HEARTBEAT_INTERVAL", 15))
+HEARTBEAT_TIMEOUT = float(os.environ.get("HEARTBEAT_TIMEOUT", 45))
+PING_FRAME = encode_message({"type": "ping"}).decode()
+
+# Read when /metrics is scraped
+Gauge("impostor_active_games", "Games held by this worker", lambda: len(active_games))
+Gauge("impostor_active_players", "Registered players held by this worker", lambda: len(active_players))
+Gauge("impostor_active_connections", "Open websockets on this worker", lambda: sum(len(c) for c in manager.active_connections.values()))
+Counter("impostor_word_cache_hits_total", "Word requests served from the category pool", lambda: category_pool.hits)
+Counter("impostor_word_cache_misses_total", "Word requests that had to wait for a fetch", lambda: category_pool.misses)
+Counter("impostor_word_fetches_total", "Batches of words fetched from Claude", lambda: category_pool.fetches)
+Counter("impostor_rate_limited_connection_total", "Websocket messages dropped by a connection's rate limit", lambda: limiter.dropped_connection)
+Counter("impostor_rate_limited_room_total", "Websocket messages dropped by a room's rate limit", lambda: limiter.dropped_room)
+rejected_frames = Counter("impostor_rejected_frames_total", "Websocket frames dropped as malformed, unknown or oversized")
 
 @app.post("/player/register")
 def register_player_endpoint(name:str):
@@ -33,56 +97,117 @@ def register_player_endpoint(name:str):
     return {"player_id": player_id}
 
 @app.post("/game/create")
-def create_game_endpoint(host_id: str, max_round: int, clue_time: int, secret_category: str, passcode: str = ""):
+def create_game_endpoint(host_id: str, max_round: int, clue_time: int, secret_category: str, passcode: str = "", coalesce_ms: int = 0):
     if secret_category and passcode != os.environ.get("CATEGORY_PASSCODE", ""):
         return {"error": "Invalid passcode for custom category"}
+    if not 1 <= max_round <= MAX_ROUNDS or not 0 <= clue_time <= MAX_CLUE_TIMER:
+        return {"error": f"Rounds must be 1 to {MAX_ROUNDS} and the timer 0 to {MAX_CLUE_TIMER} seconds"}
     game_id = create_game(host_id, max_round, clue_time, secret_category)
+    # Big rooms can merge bursts of ready/vote updates, e.g. coalesce_ms=30
+    manager.set_coalescing(game_id, min(max(coalesce_ms, 0), 500) / 1000)
     return {"game_id": game_id}
 
 
 async def cleanup_loop():
     while True:
-        await asyncio.sleep(60)  # Check every minute
-        deleted = cleanup_inactive_games(5)
+        # Sleep until the oldest game could expire instead of polling every game
+        await asyncio.sleep(max(next_cleanup_delay(5), 0.05))
+        with timer(cleanup_sweep_seconds):
+            deleted = cleanup_inactive_games(5)
         for game_id in deleted:
-            await manager.broadcast_to_game(game_id, {
+            await manager.broadcast_raw(game_id, encode_message({
                 "type": "game_deleted",
                 "data": {"reason": "Game timed out due to inactivity"}
-            })
-            # Clean up connections
-            if game_id in manager.active_connections:
-                del manager.active_connections[game_id]
+            }))
+            # Clean up connections once the notice has been flushed
+            manager.close_game(game_id)
+            actors.stop_game(game_id)
+            stop_turn_timer(game_id)
+            pending_votes.pop(game_id, None)
+            limiter.forget(game_id)
+
+def heartbeat_sweep():
+    # Runs on the shared scheduler, one sweep over every connection
+    scheduler.schedule("heartbeat", HEARTBEAT_INTERVAL, heartbeat_sweep)
+    dead = manager.sweep(PING_FRAME, HEARTBEAT_TIMEOUT)
+    if dead:
+        return notify_disconnected(dead)
+
+async def notify_disconnected(dead: dict[str, list[str]]):
+    for game_id, player_ids in dead.items():
+        # One notice per room however many of its sockets died in the sweep,
+        # player_id is kept for clients that only read the one
+        await manager.broadcast_raw(game_id, encode_message({
+            "type": "player_disconnected",
+            "player_id": player_ids[0],
+            "player_ids": player_ids
+        }))
+
+manager.on_drop = notify_disconnected
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    # async so the gauges are read on the event loop thread, not in the threadpool
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/player/{player_id}")
+def get_player_endpoint(player_id: str):
+    # Used by the shard router to carry a player over to the worker owning a game
+    from game_manager import active_players
+    player = active_players.get(player_id)
+    if not player:
+        return {"error": "Player not found"}
+    return {"player_id": player.id, "name": player.name}
 
 @app.post("/game/join")
-async def join_game_endpoint(player_id: str, game_id: str):
-    success = join_game(player_id, game_id)
-    if success:
+async def join_game_endpoint(player_id: str, game_id: str, name: str = ""):
+    # The endpoints that change a game run on its actor too, so they never
+    # land in the middle of one of its handlers
+    async def join():
+        if not join_game(player_id, game_id, name):
+            return None
         # Get the player's name to broadcast
         from game_manager import active_players
         player = active_players.get(player_id)
         player_name = player.name if player else "Unknown"
         
         # Broadcast to everyone in the game
-        await manager.broadcast_to_game(game_id, {
+        await manager.broadcast_raw(game_id, encode_message({
             "type": "player_joined",
             "data": {
                 "player_id": player_id,
                 "name": player_name
             }
-        })
+        }))
         
         # Return current player list
         game = active_games[game_id]
         players = [{"id": p.id, "name": p.name} for p in game.loPlayers]
         return {"message": "Successfully joined the game", "players": players}
+    
+    result = await actors.ask(game_id, join)
+    if result:
+        return result
     else:
         return {"message": "Game not found"}
 
 @app.post("/game/rejoin")
-async def rejoin_game_endpoint(game_id: str, player_id: str):
+async def rejoin_game_endpoint(game_id: str, player_id: str, last_seq: int = None, vote_deltas: bool = False):
     result = rejoin_game(game_id, player_id)
     
     if result["status"] == "success":
+        result["event_seq"] = event_log.current_seq(game_id)
+        # A client that knows the last event_seq it saw only gets what it missed,
+        # unless those events are no longer kept. Vote updates come in the
+        # form the client will ask for when it reconnects.
+        if last_seq is not None:
+            missed = event_log.since(game_id, player_id, last_seq, {"vote_deltas"} if vote_deltas else ())
+            if missed is not None:
+                return {
+                    "status": "success",
+                    "event_seq": result["event_seq"],
+                    "replay": [json.loads(frame) for frame in missed]
+                }
         # Re-establish WebSocket will happen separately when client connects
         return result
     else:
@@ -90,58 +215,65 @@ async def rejoin_game_endpoint(game_id: str, player_id: str):
 
 @app.post("/game/start")
 async def start_game_endpoint(game_id: str):
-    success = start_game(game_id)
-    if success:
-        await manager.broadcast_to_game(game_id, {
+    async def start():
+        if not await start_game(game_id):
+            return False
+        await manager.broadcast_raw(game_id, encode_message({
             "type": "game_started",
             "data": {"game_id": game_id}
-        })
+        }))
+        return True
+    
+    if await actors.ask(game_id, start):
         return {"message": "Successfully started the game"}
     else:
         return {"message": "Game not found"}
 
 @app.post("/session/start")
 async def session_start_endpoint(game_id: str):
-    success = start_session(game_id)
+    success = await actors.ask(game_id, lambda: begin_session(game_id))
     if not success:
         return {"message": "Game not found"}
     
+    store.mark_dirty(game_id)
+    return {"message": "Successfully started the session"}
+
+async def begin_session(game_id: str) -> bool:
+    # Starts the next session and tells everyone their role, for both
+    # /session/start and the host's start_next_session
+    success = await start_session(game_id)
+    if not success:
+        return False
+    
     game = active_games[game_id]
     session = game.currentSession
-    
-    turn_order = [{"name": p.name, "id": p.id} for p in session.playOrder]
     first_player = session.playOrder[0]
     
-    for player in game.loPlayers:
-        if player == session.currentImpostor:
-            await manager.send_to_player(game_id, player.id, {
-                "type": "session_started",
-                "data": {
-                    "role": "impostor",
-                    "word": None,
-                    "turn_order": turn_order,
-                    "current_turn": first_player.name,
-                    "current_turn_id": first_player.id,
-                    "clue_timer": game.clueTimer,
-                    "max_round": game.maxRound
-                }
-            })
-        else:
-            await manager.send_to_player(game_id, player.id, {
-                "type": "session_started",
-                "data": {
-                    "role": "player",
-                    "word": session.secretWord,
-                    "turn_order": turn_order,
-                    "current_turn": first_player.name,
-                    "current_turn_id": first_player.id,
-                    "clue_timer": game.clueTimer,
-                    "max_round": game.maxRound
-                }
-            })
+    # Fresh round state for all players, before vote_seq is read
+    game.resetRound()
+    
+    # Everything but the role is the same for the whole room, so the frame
+    # is encoded once per role instead of once per player
+    data = {
+        "role": "player",
+        "word": session.secretWord,
+        "turn_order": [{"name": p.name, "id": p.id} for p in session.playOrder],
+        "current_turn": first_player.name,
+        "current_turn_id": first_player.id,
+        "clue_timer": game.clueTimer,
+        "max_round": game.maxRound,
+        "vote_seq": game.voteSeq
+    }
+    player_frame = encode_message({"type": "session_started", "data": data})
+    # Impostor gets no word
+    impostor_frame = encode_message({"type": "session_started", "data": {**data, "role": "impostor", "word": None}})
+    
+    # One room event, so a big room's session start takes a single slot in
+    # the replay log
+    await manager.broadcast_with_overrides(game_id, player_frame, {session.currentImpostor.id: impostor_frame})
     
     game.nextPhase()  # LOBBY → DELEGATION
-    return {"message": "Successfully started the session"}
+    return True
 
 @app.get("/game/{game_id}/state")
 def get_game_state(game_id:str):
@@ -160,16 +292,20 @@ def get_game_state(game_id:str):
         "current_session": session_info}
 
 @app.post("/game/vote")
-def vote_endpoint(game_id: str, player_id: str, vote_for_id: str):
-    success = submit_vote(game_id, player_id, vote_for_id)
+async def vote_endpoint(game_id: str, player_id: str, vote_for_id: str):
+    async def vote():
+        return submit_vote(game_id, player_id, vote_for_id)
+    success = await actors.ask(game_id, vote)
     if success:
         return {"message": "Vote submitted"}
     else:
         return {"message": "Vote failed"}
 
 @app.post("/game/end_session")
-def end_session_endpoint(game_id: str):
-    result = end_session(game_id)
+async def end_session_endpoint(game_id: str):
+    async def end():
+        return end_session(game_id)
+    result = await actors.ask(game_id, end)
     if result:
         return result
     else:
@@ -177,71 +313,95 @@ def end_session_endpoint(game_id: str):
     
 @app.websocket("/ws/{game_id}/{player_id}")
 
-async def websocket_endpoint(websocket: WebSocket, game_id: str, player_id: str):
-    await manager.connect(websocket, game_id, player_id)
+async def websocket_endpoint(websocket: WebSocket, game_id: str, player_id: str, vote_deltas: bool = False, heartbeat: bool = False, msgpack: bool = False):
+    # Newer clients opt in to delta vote updates with ?vote_deltas=true, to
+    # pings with ?heartbeat=true and to binary frames with ?msgpack=true
+    features = set()
+    if vote_deltas:
+        features.add("vote_deltas")
+    if heartbeat:
+        features.add("heartbeat")
+    if msgpack and BINARY_FRAMES:
+        features.add("msgpack")
+    if game_id not in active_games:
+        await websocket.close(code=1008, reason="Game not found")
+        return
+    connection = await manager.connect(websocket, game_id, player_id, features)
+    # This connection's rate limit buckets by message type, see rate_limit.py
+    buckets = {}
     
     try:
         while True:
-            message = await websocket.receive_json()
-            await handle_message(game_id, player_id, message)
-            #This keeps this loop running, but await lets other code run
+            received = await websocket.receive()
+            if received["type"] == "websocket.disconnect":
+                break
+            now = connection.last_seen = time.monotonic()
+            frame = received.get("text")
+            if frame is None:
+                frame = received.get("bytes") or b""
+            try:
+                message = load(frame, connection.binary)
+                if message["type"] == "pong":
+                    continue
+                command = parse(message)
+            except FrameTooLarge:
+                rejected_frames.inc()
+                with suppress(Exception):
+                    await websocket.close(code=1009)
+                break
+            except ProtocolError as e:
+                # Only the sender hears about it, nothing reaches the game
+                rejected_frames.inc()
+                connection.send(encode_message({"type": "error", "data": {"message": str(e)}}))
+                continue
+            if game_id not in active_games:
+                # Deleted while this frame was on its way, close_game is
+                # closing the socket
+                break
+            if not limiter.allow(buckets, game_id, command.route.type, now):
+                # Every drop is answered, so a client that flipped its own
+                # state before sending (ready toggles) can flip it back
+                connection.send(encode_message({"type": "rate_limited", "data": {"message_type": command.route.type}}))
+                continue
+            # The game's actor runs it after the room's earlier messages
+            if not await actors.submit(game_id, player_id, command):
+                break
             
     except WebSocketDisconnect:
-        manager.disconnect(game_id, player_id)
-        await manager.broadcast_to_game(game_id, {
+        pass
+    # Evicted or dropped sockets were already announced by the heartbeat or
+    # manager.on_drop
+    if manager.disconnect(game_id, player_id, websocket):
+        await manager.broadcast_raw(game_id, encode_message({
             "type": "player_disconnected",
             "player_id": player_id
-        })
+        }))
 
-async def handle_message(game_id: str, player_id: str, message: dict):
+async def handle_message(game_id: str, player_id: str, command: Command):
+    with timer(handler_seconds.labels(command.route.type)):
+        await dispatch_message(game_id, player_id, command)
+
+async def dispatch_message(game_id: str, player_id: str, command: Command):
+    # command was checked against its route in websocket_endpoint, see protocol.py
     update_activity(game_id)
-    message_type = message.get("type")
-    data = message.get("data", {})
-    
-    if message_type == "end_turn":
-        await handle_end_turn(game_id, player_id)
-    
-    elif message_type == "submit_vote":
-        vote_for_id = data.get("vote_for_id")
-        await handle_vote(game_id, player_id, vote_for_id)
-    
-    elif message_type == "start_next_session":
-        await handle_start_next_session(game_id, player_id)
-    
-    elif message_type == "toggle_ready":
-        await handle_toggle_ready(game_id, player_id)
-    
-    elif message_type == "toggle_ready_start":
-        await handle_toggle_ready_start(game_id, player_id)
-    
-    elif message_type == "finalize_votes":
-        await handle_finalize_votes(game_id, player_id)
-    
-    elif message_type == "new_game":
-        new_category = data.get("category")
-        max_round = data.get("max_round")
-        clue_timer = data.get("clue_timer")
-        passcode = data.get("passcode", "")
-        await handle_new_game(game_id, player_id, new_category, max_round, clue_timer, passcode)
-    
-    elif message_type == "quit_game":
-        await handle_quit_game(game_id, player_id)
-    
-    elif message_type == "skip_turn":
-        await handle_skip_turn(game_id, player_id)
+    event_log.command(game_id, player_id, command.redacted())
+    await command.route.handler(game_id, player_id, **command.args)
+    # Picked up by the store's next flush, after the handler has finished
+    store.mark_dirty(game_id)
 
-    elif message_type == "change_timer":
-        new_time = data.get("new_time", 30)
-        await handle_change_timer(game_id, player_id, new_time)
-    
-    elif message_type == "continue_game":
-        await handle_continue_game(game_id, player_id)
+# One task per game runs its messages in order, see game_actor.py
+actors = ActorRegistry(handle_message, manager, lambda game_id: game_id in active_games)
 
+@route("end_turn")
 async def handle_end_turn(game_id: str, player_id: str):
     game = active_games.get(game_id)
     if not game or not game.currentSession:
         return
     
+    await advance_turn(game_id, game)
+
+async def advance_turn(game_id: str, game, **extra):
+    # Moves to the next player, tells the room and restarts the turn deadline
     session = game.currentSession
     
     # Move to next turn
@@ -254,106 +414,184 @@ async def handle_end_turn(game_id: str, player_id: str):
     # Get next player
     next_player = session.playOrder[session.currentTurnIndex]
     
-    await manager.broadcast_to_game(game_id, {
+    await manager.broadcast_raw(game_id, encode_message({
         "type": "next_turn",
         "data": {
             "player_id": next_player.id,
-            "player_name": next_player.name
+            "player_name": next_player.name,
+            **extra
         }
-    })
+    }))
+    start_turn_timer(game_id)
+
+def start_turn_timer(game_id: str):
+    # (Re)starts the current turn's deadline on the shared scheduler. Only
+    # the clue phase has turns, and clue_timer 0 means no timer.
+    deadline = turn_deadlines.get(game_id, 0) + 1
+    turn_deadlines[game_id] = deadline
+    game = active_games.get(game_id)
+    if not game or game.phase != GamePhase.DECEPTION or not game.clueTimer or not game.currentSession:
+        scheduler.cancel(("turn", game_id))
+        return
+    scheduler.schedule(("turn", game_id), game.clueTimer + TURN_GRACE_SECONDS,
+                       lambda: actors.call(game_id, lambda: handle_turn_timeout(game_id, deadline)))
+
+def stop_turn_timer(game_id: str):
+    turn_deadlines.pop(game_id, None)
+    scheduler.cancel(("turn", game_id))
+
+async def handle_turn_timeout(game_id: str, deadline: int):
+    # Runs on the game's actor, so an end_turn handled just before wins
+    if game_id not in active_games:
+        # Deleted while the timeout was queued, don't leave an idle actor behind
+        actors.stop_game(game_id)
+        return
+    if turn_deadlines.get(game_id) != deadline:
+        return
+    game = active_games.get(game_id)
+    if not game or game.phase != GamePhase.DECEPTION or not game.currentSession:
+        return
+    await advance_turn(game_id, game, timed_out=True)
 
+@route("toggle_ready")
 async def handle_toggle_ready(game_id: str, player_id: str):
     game = active_games.get(game_id)
     if not game:
         return
     
     # Find the player and toggle their status
-    player = None
-    for p in game.loPlayers:
-        if p.id == player_id:
-            p.toggle_ready_to_vote()
-            player = p
-            break
-    
+    player = game.getPlayer(player_id)
     if not player:
         return
+    game.toggleReadyToVote(player)
     
     # Count how many are ready
-    ready_count = sum(1 for p in game.loPlayers if p.ready_to_vote)
+    ready_count = game.readyToVoteCount
     total_players = len(game.loPlayers)
     
-    # Broadcast the change
-    await manager.broadcast_to_game(game_id, {
-        "type": "player_ready_changed",
-        "data": {
-            "player_id": player_id,
-            "is_ready": player.ready_to_vote,
-            "ready_count": ready_count,
-            "total_players": total_players
-        }
-    })
+    # Broadcast the change (counts are read when it is sent, so a coalesced one is current)
+    async def send_ready_changed():
+        await manager.broadcast_raw(game_id, encode_message({
+            "type": "player_ready_changed",
+            "data": {
+                "player_id": player_id,
+                "is_ready": game.isReadyToVote(player),
+                "ready_count": game.readyToVoteCount,
+                "total_players": len(game.loPlayers)
+            }
+        }))
+    
+    await manager.broadcast_coalesced(game_id, "player_ready_changed", send_ready_changed)
     
     # Check if everyone is ready
     if ready_count == total_players:
         game.nextPhase()  # Transition to VOTING
-        await manager.broadcast_to_game(game_id, {
+        stop_turn_timer(game_id)
+        await manager.broadcast_raw(game_id, encode_message({
             "type": "clue_phase_complete",
             "data": {}
-        })
+        }))
 
+@route("submit_vote", vote_for_id=Field(str))
 async def handle_vote(game_id: str, player_id: str, vote_for_id: str):
     game = active_games.get(game_id)
     if not game:
         return
     
     # Find the voting player
-    voting_player = None
-    for p in game.loPlayers:
-        if p.id == player_id:
-            voting_player = p
-            break
-    
+    voting_player = game.getPlayer(player_id)
     if not voting_player:
         return
     
-    # If player already voted for someone, remove that vote first
-    if voting_player.voted_for_id:
-        for p in game.loPlayers:
-            if p.id == voting_player.voted_for_id:
-                p.votes -= 1
-                break
+    # Move this player's vote (drops their previous one, if any)
+    changes = game.castVote(voting_player, vote_for_id)
     
-    # Add new vote
-    for p in game.loPlayers:
-        if p.id == vote_for_id:
-            p.votes += 1
-            break
+    # Collect the changes until the vote_update goes out, which is right
+    # away unless the room coalesces its updates
+    batch = pending_votes.setdefault(game_id, {"base_seq": game.voteSeq - 1, "changes": {}})
+    for p, delta in changes:
+        batch["changes"][p.id] = batch["changes"].get(p.id, 0) + delta
+    batch["voter_id"] = player_id
+    batch["voted_for_id"] = vote_for_id
     
-    # Update who this player voted for
-    voting_player.voted_for_id = vote_for_id
-    voting_player.has_voted = True
+    await manager.broadcast_coalesced(game_id, "vote_update", lambda: send_vote_update(game_id))
+
+async def send_vote_update(game_id: str):
+    batch = pending_votes.pop(game_id, None)
+    game = active_games.get(game_id)
+    if not batch or not game:
+        return
     
-    # Count how many have voted
-    votes_in = sum(1 for p in game.loPlayers if p.has_voted)
-    total_players = len(game.loPlayers)
+    vote_data = {
+        "seq": game.voteSeq,
+        "voter_id": batch["voter_id"],
+        "voted_for_id": batch["voted_for_id"],
+        "votes_in": game.votesIn,
+        "total_players": len(game.loPlayers),
+    }
+    
+    # Clients that asked for vote deltas only get the counts that changed.
+    # base_seq is the seq they should be at, anything else means a missed
+    # update. Votes are reset with a new seq, which session_started,
+    # session_results and new_game_started carry as vote_seq.
+    changes = []
+    for changed_id, delta in batch["changes"].items():
+        p = game.getPlayer(changed_id)
+        if p and delta:
+            changes.append({"id": p.id, "delta": delta, "votes": game.getVotes(p)})
+    delta_frame = encode_message({
+        "type": "vote_update",
+        "data": {**vote_data, "base_seq": batch["base_seq"], "changes": changes}
+    })
     
-    # Build vote tally for broadcast
-    vote_tally = [
-        {"id": p.id, "name": p.name, "votes": p.votes} 
-        for p in game.loPlayers
-    ]
+    # Everyone else (the current Flutter client) still gets the full tally.
+    # It is only built if one of them is here or replays this update, from
+    # the counts at that point, which is what the client ends up showing
+    # anyway since each full tally replaces the last.
+    def full_frame():
+        return encode_message({
+            "type": "vote_update",
+            "data": {**vote_data, "vote_tally": vote_tally(game.loPlayers, game.voteCounts())}
+        })
     
-    await manager.broadcast_to_game(game_id, {
-        "type": "vote_update",
+    await manager.broadcast_for_feature(game_id, "vote_deltas", delta_frame, full_frame)
+
+@route("vote_snapshot")
+async def handle_vote_snapshot(game_id: str, player_id: str):
+    game = active_games.get(game_id)
+    if not game:
+        return
+    
+    # Sent by delta clients that noticed a gap in the seq numbers
+    await manager.send_to_player(game_id, player_id, {
+        "type": "vote_snapshot",
         "data": {
-            "voter_id": player_id,
-            "voted_for_id": vote_for_id,
-            "votes_in": votes_in,
-            "total_players": total_players,
-            "vote_tally": vote_tally
+            "seq": game.voteSeq,
+            "votes_in": game.votesIn,
+            "total_players": len(game.loPlayers),
+            "vote_tally": vote_tally(game.loPlayers, game.voteCounts())
         }
     })
 
+async def send_vote_snapshot(game_id: str, game):
+    # Votes changed without a vote (a voter left): delta clients get the whole
+    # tally at the new seq, the rest the vote_update they always get
+    data = {
+        "seq": game.voteSeq,
+        "votes_in": game.votesIn,
+        "total_players": len(game.loPlayers),
+        "vote_tally": vote_tally(game.loPlayers, game.voteCounts())
+    }
+    await manager.broadcast_for_feature(game_id, "vote_deltas", encode_message({"type": "vote_snapshot", "data": data}),
+                                        lambda: encode_message({"type": "vote_update", "data": data}))
+
+def vote_tally(players, counts) -> list[dict]:
+    return [
+        {"id": p.id, "name": p.name, "votes": votes} 
+        for p, votes in zip(players, counts)
+    ]
+
+@route("finalize_votes")
 async def handle_finalize_votes(game_id: str, player_id: str):
     game = active_games.get(game_id)
     if not game:
@@ -363,48 +601,38 @@ async def handle_finalize_votes(game_id: str, player_id: str):
     if player_id != game.hostID:
         return
     
-    # Check for tie - find top vote count
-    max_votes = 0
-    for p in game.loPlayers:
-        if p.votes > max_votes:
-            max_votes = p.votes
-    
-    # Count how many players have the max votes
-    players_with_max = sum(1 for p in game.loPlayers if p.votes == max_votes)
-    
     # If tie (more than one player with max votes), don't allow finalize
-    if players_with_max > 1:
-        await manager.broadcast_to_game(game_id, {
+    if game.isVoteTie():
+        await manager.broadcast_raw(game_id, encode_message({
             "type": "vote_tie",
             "data": {
                 "message": "It's a tie! Keep voting until there's a majority."
             }
-        })
+        }))
         return
     
+    # Send any coalesced vote_update before end_session resets the votes
+    await manager.flush(game_id)
+    
     # End session and get results
     result = end_session(game_id)
     
     # Check if game is over (no more rounds)
     rounds_remaining = len(game.impostorSchedule)
     
-    await manager.broadcast_to_game(game_id, {
+    await manager.broadcast_raw(game_id, encode_message({
         "type": "session_results",
         "data": {
             "impostor_caught": result["impostor_caught"],
             "impostor_name": result["impostor_name"],
             "voted_out_name": result["voted_out_name"],
             "players": [{"name": p.name, "points": p.points} for p in game.loPlayers],
-            "game_over": rounds_remaining == 0
+            "game_over": rounds_remaining == 0,
+            "vote_seq": game.voteSeq
         }
-    })
-    
-    # Reset vote state for next session
-    for p in game.loPlayers:
-        p.has_voted = False
-        p.voted_for_id = None
-        p.votes = 0
+    }))
 
+@route("start_next_session")
 async def handle_start_next_session(game_id: str, player_id: str):
     game = active_games.get(game_id)
     if not game:
@@ -414,86 +642,37 @@ async def handle_start_next_session(game_id: str, player_id: str):
     if player_id != game.hostID:
         return
     
-    # Start the session (creates new SecretWordSession)
-    success = start_session(game_id)
-    if not success:
-        return
-    
-    session = game.currentSession
-    
-    # Build turn order info (list of player names)
-    turn_order = [{"name": p.name, "id": p.id} for p in session.playOrder]
-    first_player = session.playOrder[0]
-    
-    # Send personalized message to each player
-    for player in game.loPlayers:
-        if player == session.currentImpostor:
-            # Impostor gets no word
-            await manager.send_to_player(game_id, player.id, {
-                "type": "session_started",
-                "data": {
-                    "role": "impostor",
-                    "word": None,
-                    "turn_order": turn_order,
-                    "current_turn": first_player.name,
-                    "current_turn_id": first_player.id,
-                    "clue_timer": game.clueTimer,
-                    "max_round": game.maxRound
-                }
-            })
-        else:
-            # Regular players get the word
-            await manager.send_to_player(game_id, player.id, {
-                "type": "session_started",
-                "data": {
-                    "role": "player",
-                    "word": session.secretWord,
-                    "turn_order": turn_order,
-                    "current_turn": first_player.name,
-                    "current_turn_id": first_player.id,
-                    "clue_timer": game.clueTimer,
-                    "max_round": game.maxRound
-                }
-            })
-
-    # Reset ready flags for all players
-    for p in game.loPlayers:
-        p.ready_to_vote = False
-        p.ready_to_start = False
-    
-    # Update game phase
-    game.nextPhase()  # LOBBY → DELEGATION
+    await begin_session(game_id)
 
+@route("toggle_ready_start")
 async def handle_toggle_ready_start(game_id: str, player_id: str):
     game = active_games.get(game_id)
     if not game:
         return
     
     # Find player and toggle
-    player = None
-    for p in game.loPlayers:
-        if p.id == player_id:
-            p.toggle_ready_to_start()
-            player = p
-            break
-    
+    player = game.getPlayer(player_id)
     if not player:
         return
+    game.toggleReadyToStart(player)
     
     # Count ready players
-    ready_count = sum(1 for p in game.loPlayers if p.ready_to_start)
+    ready_count = game.readyToStartCount
     total_players = len(game.loPlayers)
     
     # Broadcast update
-    await manager.broadcast_to_game(game_id, {
-        "type": "player_ready_start_changed",
-        "data": {
-            "player_id": player_id,
-            "is_ready": player.ready_to_start,
-            "ready_count": ready_count,
-            "total_players": total_players
-        }
-    })
+    async def send_ready_start_changed():
+        await manager.broadcast_raw(game_id, encode_message({
+            "type": "player_ready_start_changed",
+            "data": {
+                "player_id": player_id,
+                "is_ready": game.isReadyToStart(player),
+                "ready_count": game.readyToStartCount,
+                "total_players": len(game.loPlayers)
+            }
+        }))
+    
+    await manager.broadcast_coalesced(game_id, "player_ready_start_changed", send_ready_start_changed)
     
     # Check if everyone ready
     if ready_count == total_players:
@@ -503,19 +682,21 @@ async def handle_toggle_ready_start(game_id: str, player_id: str):
         session = game.currentSession
         first_player = session.playOrder[0]
         
-        await manager.broadcast_to_game(game_id, {
+        await manager.broadcast_raw(game_id, encode_message({
             "type": "clue_phase_started",
             "data": {
                 "current_turn": first_player.name,
                 "current_turn_id": first_player.id,
                 "clue_timer": game.clueTimer  # Could be 0 for no timer
             }
-        })
+        }))
+        start_turn_timer(game_id)
         
         # Reset ready flags for next time
-        for p in game.loPlayers:
-            p.ready_to_start = False
+        game.resetReadyToStart()
     
+@route("new_game", category=Field(str, max_length=100, arg="new_category"), max_round=Field(int, minimum=1, maximum=MAX_ROUNDS),
+       clue_timer=Field(int, minimum=0, maximum=MAX_CLUE_TIMER), passcode=Field(str, default="", secret=True))
 async def handle_new_game(game_id: str, player_id: str, new_category: str = None, max_round: int = None, clue_timer: int = None, passcode: str = ""):
     game = active_games.get(game_id)
     if not game:
@@ -544,62 +725,65 @@ async def handle_new_game(game_id: str, player_id: str, new_category: str = None
     game.wordsAvailable = []
     game.impostorSchedule = []
     
-    # Reset player points
-    for p in game.loPlayers:
-        p.points = 0
-        p.ready_to_start = False
-        p.ready_to_vote = False
-        p.has_voted = False
-        p.voted_for_id = None
-        p.votes = 0
+    # Reset player points, votes and ready flags
+    game.resetRound(points=True)
     
     # Regenerate words and impostor schedule
-    from game_manager import createImpostorSchedule
-    from claude_service import generate_secret_word
+    from game_manager import createImpostorSchedule, fetch_words
     
     game.impostorSchedule = createImpostorSchedule(game.loPlayers, game.maxRound)
-    if game.secretCategory:
-        words = generate_secret_word(game.secretCategory, game.maxRound, game.wordsUsed)
-    else:
-        from game_manager import load_default_words
-        words = load_default_words(game.maxRound, game.wordsUsed)
-        game.fillAvailableWords(words)
+    words = await fetch_words(game.secretCategory, game.maxRound, game.wordsUsed)
+    game.fillAvailableWords(words)
     
     # Reset phase
     game.phase = GamePhase.LOBBY
     
-    await manager.broadcast_to_game(game_id, {
+    await manager.broadcast_raw(game_id, encode_message({
         "type": "new_game_started",
         "data": {
             "category": game.secretCategory,
-            "same_category": new_category is None
+            "same_category": new_category is None,
+            "vote_seq": game.voteSeq
         }
-    })
+    }))
 
+@route("quit_game")
 async def handle_quit_game(game_id: str, player_id: str):
+    game = active_games.get(game_id)
+    vote_seq = game.voteSeq if game else None
+    # Votes still waiting to go out were counted with this player in the room
+    await manager.flush(game_id)
     result = quit_game(game_id, player_id)
     
     if result["status"] == "game_deleted":
-        await manager.broadcast_to_game(game_id, {
+        await manager.broadcast_raw(game_id, encode_message({
             "type": "game_deleted",
             "data": {}
-        })
+        }))
+        manager.close_game(game_id)
+        actors.stop_game(game_id)
+        stop_turn_timer(game_id)
+        pending_votes.pop(game_id, None)
+        limiter.forget(game_id)
         return
     
     if result["status"] == "player_removed":
         # Notify remaining players
-        await manager.broadcast_to_game(game_id, {
+        await manager.broadcast_raw(game_id, encode_message({
             "type": "player_quit",
             "data": {
                 "player_name": result["player_name"],
                 "player_id": player_id,
                 "new_host_id": result["new_host_id"]
             }
-        })
+        }))
+        if game.voteSeq != vote_seq:
+            await send_vote_snapshot(game_id, game)
     
     # Disconnect the quitting player's websocket
     manager.disconnect(game_id, player_id)
 
+@route("continue_game")
 async def handle_continue_game(game_id: str, player_id: str):
     game = active_games.get(game_id)
     if not game:
@@ -607,11 +791,12 @@ async def handle_continue_game(game_id: str, player_id: str):
     if player_id != game.hostID:
         return
     
-    await manager.broadcast_to_game(game_id, {
+    await manager.broadcast_raw(game_id, encode_message({
         "type": "host_choosing_settings",
         "data": {}
-    })
+    }))
 
+@route("skip_turn")
 async def handle_skip_turn(game_id: str, player_id: str):
     game = active_games.get(game_id)
     if not game or not game.currentSession:
@@ -621,24 +806,9 @@ async def handle_skip_turn(game_id: str, player_id: str):
     if player_id != game.hostID:
         return
     
-    session = game.currentSession
-    
-    # Move to next turn
-    session.currentTurnIndex += 1
-    if session.currentTurnIndex >= len(session.playOrder):
-        session.currentTurnIndex = 0
-    
-    next_player = session.playOrder[session.currentTurnIndex]
-    
-    await manager.broadcast_to_game(game_id, {
-        "type": "next_turn",
-        "data": {
-            "player_id": next_player.id,
-            "player_name": next_player.name,
-            "was_skipped": True
-        }
-    })
+    await advance_turn(game_id, game, was_skipped=True)
 
+@route("change_timer", new_time=Field(int, default=30, minimum=0, maximum=MAX_CLUE_TIMER))
 async def handle_change_timer(game_id: str, player_id: str, new_time: int):
     game = active_games.get(game_id)
     if not game:
@@ -648,8 +818,12 @@ async def handle_change_timer(game_id: str, player_id: str, new_time: int):
     
     game.clueTimer = new_time
     
-    await manager.broadcast_to_game(game_id, {
+    await manager.broadcast_raw(game_id, encode_message({
         "type": "timer_changed",
         "data": {"new_time": new_time}
-    })
+    }))
+    # Clients restart their countdown with the new time, and so does the server
+    start_turn_timer(game_id)
 
+# Every routed message type gets its own latency histogram
+handler_seconds = Histogram("impostor_handler_seconds", "Time to handle one websocket message", label="type", values=tuple(routes))
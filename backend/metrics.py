@@ -0,0 +1,117 @@
+import time
+from bisect import bisect_left
+
+# Prometheus metrics without a client library. Everything is updated from
+# the event loop thread, so counters are plain ints with no locks, and each
+# histogram's buckets are allocated once up front; observing a value is a
+# bisect and three additions. GET /metrics renders the text format.
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+registry = []
+
+
+class Counter:
+    def __init__(self, name: str, help: str, read=None):
+        # read() gives the value for counters kept elsewhere (e.g. the word pool)
+        self.name = name
+        self.help = help
+        self.value = 0
+        self.read = read
+        registry.append(self)
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+    def render(self) -> list[str]:
+        value = self.read() if self.read else self.value
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter", f"{self.name} {value}"]
+
+
+class Gauge:
+    def __init__(self, name: str, help: str, read):
+        # Read when scraped, so nothing has to keep it up to date
+        self.name = name
+        self.help = help
+        self.read = read
+        registry.append(self)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self.read()}"]
+
+
+class Buckets:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        # One slot per bound plus +Inf
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: tuple = LATENCY_BUCKETS, label: str = None, values=()):
+        # With a label, every allowed value gets its buckets here and now;
+        # anything else is counted under "other" so clients can't add series
+        self.name = name
+        self.help = help
+        self.bounds = tuple(buckets)
+        self.label = label
+        self.children = {value: Buckets(self.bounds) for value in (*values, "other")} if label else {None: Buckets(self.bounds)}
+        registry.append(self)
+
+    def labels(self, value: str) -> Buckets:
+        return self.children.get(value) or self.children["other"]
+
+    def observe(self, value: float):
+        self.children[None].observe(value)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for value, buckets in self.children.items():
+            if self.label and not buckets.count:
+                continue
+            labels = f'{self.label}="{value}",' if self.label else ""
+            total = 0
+            for bound, count in zip((*self.bounds, "+Inf"), buckets.counts):
+                total += count
+                lines.append(f'{self.name}_bucket{{{labels}le="{bound}"}} {total}')
+            suffix = f"{{{labels[:-1]}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {buckets.sum}")
+            lines.append(f"{self.name}_count{suffix} {buckets.count}")
+        return lines
+
+
+def render() -> str:
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class timer:
+    # with timer(histogram.labels("vote")): ...
+    __slots__ = ("buckets", "start")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.buckets.observe(time.perf_counter() - self.start)
+
+
+broadcast_fanout = Histogram("impostor_broadcast_fanout", "Sockets a room broadcast was pushed to on this worker", SIZE_BUCKETS)
+broadcast_seconds = Histogram("impostor_broadcast_seconds", "Time to push one room broadcast to every local socket")
+word_generation_seconds = Histogram("impostor_word_generation_seconds", "Time to fetch a batch of words for a category")
+cleanup_sweep_seconds = Histogram("impostor_cleanup_sweep_seconds", "Time spent in one inactive-game cleanup sweep")
@@ -1,7 +1,9 @@
 from enum import Enum
 import random
 from math import floor
-from datetime import datetime
+import time
+
+from audience import AUDIENCE_THRESHOLD, AudienceRound
 
 class GamePhase (Enum):
     #this class is to help keep track of which phase of the game its in
@@ -13,20 +15,23 @@ class GamePhase (Enum):
 
 class Player ():
     #class for each human player that will be playing
+    #slots instead of a __dict__, there can be many thousands of these
+    __slots__ = ("id", "name", "imposter", "votes", "ready_to_start", "ready_to_vote", "points", "has_voted", "voted_for_id")
+
     def __init__(self, name, id):
         self.id = id
         self.name = name
         self.imposter = False
-        #reset every SWS
-        self.votes = 0
-        #reset every SWS
-        self.ready_to_start = False
-            
-        self.ready_to_vote = False
-        #reset after ever sws
         self.points = 0
+        self.reset_round()
+
+    def reset_round(self):
+        #everything that starts over with each SWS
+        self.votes = 0
         self.has_voted = False
         self.voted_for_id = None
+        self.ready_to_start = False
+        self.ready_to_vote = False
 
     def toggle_ready_to_start(self):
         self.ready_to_start = not self.ready_to_start
@@ -35,6 +40,8 @@ class Player ():
         self.ready_to_vote  = not self.ready_to_vote
 
 class SecretWordSession ():
+    __slots__ = ("playOrder", "secretWord", "currentTurnIndex", "currentImpostor")
+
     def __init__(self, ListOfPlayers: list[Player], secretWord:str, currentImpostor:Player):
         self.playOrder = ListOfPlayers.copy()
         random.shuffle(self.playOrder)
@@ -43,6 +50,11 @@ class SecretWordSession ():
         self.currentImpostor = currentImpostor
     
 class GamePlay ():
+    __slots__ = ("gameID", "hostID", "maxRound", "clueTimer", "secretCategory", "roundTimer", "phase",
+                 "loPlayers", "playersById", "readyToVoteCount", "readyToStartCount", "votesIn",
+                 "voteBuckets", "maxVotes", "voteSeq", "impostorSchedule", "wordsAvailable",
+                 "wordsUsed", "currentSession", "last_activity", "audience")
+
     def __init__(self, gameID, hostID, maxRound, clueTimer,secretCategory):
         self.gameID = gameID
         self.hostID = hostID
@@ -52,11 +64,25 @@ class GamePlay ():
         self.roundTimer = 0
         self.phase = GamePhase.LOBBY
         self.loPlayers : list[Player] = []
+        #same players keyed by id, kept in sync with loPlayers
+        self.playersById : dict[str, Player] = {}
+        #running counters so handlers don't recount the room on every message
+        self.readyToVoteCount = 0
+        self.readyToStartCount = 0
+        self.votesIn = 0
+        #player ids grouped by how many votes they have, for the leader and ties
+        self.voteBuckets : dict[int, set[str]] = {}
+        self.maxVotes = 0
+        #bumped on every vote change so delta clients can spot a missed update
+        self.voteSeq = 0
         self.impostorSchedule: list[Player] = []
         self.wordsAvailable = []
         self.wordsUsed = []
         self.currentSession :SecretWordSession = None
-        self.last_activity = datetime.now()
+        #packed round state once the room is big enough, see updateRoundMode
+        self.audience : AudienceRound = None
+        #monotonic seconds, the expiry heap in game_manager reads it
+        self.last_activity = time.monotonic()
         
     
     def changeCategory (self, descriptionNew: str):
@@ -66,10 +92,243 @@ class GamePlay ():
         self.clueTimer = clueTimeNew
 
     def addNewPlayer (self, playerNew : Player):
+        if playerNew.id in self.playersById:
+            return
         self.loPlayers.append(playerNew)
+        self.playersById[playerNew.id] = playerNew
+        self.readyToVoteCount += playerNew.ready_to_vote
+        self.readyToStartCount += playerNew.ready_to_start
+        self.votesIn += playerNew.has_voted
+        if self.audience:
+            self.audience.add(playerNew)
+        else:
+            self.voteBuckets.setdefault(playerNew.votes, set()).add(playerNew.id)
+        self.maxVotes = max(self.maxVotes, playerNew.votes)
     
     def removePlayer(self, playerRemove):
+        if self.audience:
+            self.audience.write_back({playerRemove.id: playerRemove})
         self.loPlayers.remove(playerRemove)
+        del self.playersById[playerRemove.id]
+        self.readyToVoteCount -= playerRemove.ready_to_vote
+        self.readyToStartCount -= playerRemove.ready_to_start
+        self.votesIn -= playerRemove.has_voted
+        if playerRemove.has_voted or playerRemove.votes:
+            self.voteSeq += 1
+
+        if self.audience:
+            # Same as below, the arrays find whoever voted for them
+            votedForID, voters = self.audience.remove(playerRemove.id)
+            if votedForID in self.playersById:
+                self.changeVotes(self.playersById[votedForID], -1)
+            self.votesIn -= len(voters)
+            self.maxVotes = self.audience.max_votes()
+            return
+        self._moveVotes(playerRemove, None)
+
+        # Take back their vote, and let anyone who voted for them vote again
+        if playerRemove.voted_for_id in self.playersById:
+            self.changeVotes(self.playersById[playerRemove.voted_for_id], -1)
+        if playerRemove.votes:
+            for p in self.loPlayers:
+                if p.voted_for_id == playerRemove.id:
+                    p.voted_for_id = None
+                    p.has_voted = False
+                    self.votesIn -= 1
+
+    def getPlayer(self, playerID) -> Player | None:
+        return self.playersById.get(playerID)
+
+    #round state has to be read through these, big rooms keep it in self.audience
+    def getVotes(self, player: Player) -> int:
+        return self.audience.votes_of(player.id) if self.audience else player.votes
+
+    def isReadyToVote(self, player: Player) -> bool:
+        return bool(self.audience.ready_vote[self.audience.slots[player.id]]) if self.audience else player.ready_to_vote
+
+    def isReadyToStart(self, player: Player) -> bool:
+        return bool(self.audience.ready_start[self.audience.slots[player.id]]) if self.audience else player.ready_to_start
+
+    def voteCounts(self) -> list[int]:
+        #votes of every player, in loPlayers order
+        return self.audience.counts() if self.audience else [p.votes for p in self.loPlayers]
+
+    def toggleReadyToVote(self, player: Player):
+        if self.audience:
+            ready = self.audience.toggle(self.audience.ready_vote, player.id)
+        else:
+            player.toggle_ready_to_vote()
+            ready = player.ready_to_vote
+        self.readyToVoteCount += 1 if ready else -1
+
+    def toggleReadyToStart(self, player: Player):
+        if self.audience:
+            ready = self.audience.toggle(self.audience.ready_start, player.id)
+        else:
+            player.toggle_ready_to_start()
+            ready = player.ready_to_start
+        self.readyToStartCount += 1 if ready else -1
+
+    def castVote(self, voter: Player, voteForID) -> list[tuple[Player, int]]:
+        #returns the players whose vote count changed and by how much
+        if self.audience:
+            previousID, firstVote = self.audience.cast(voter.id, voteForID)
+        else:
+            previousID, firstVote = voter.voted_for_id, not voter.has_voted
+            voter.voted_for_id = voteForID
+            voter.has_voted = True
+        changes = []
+        previous = self.playersById.get(previousID)
+        target = self.playersById.get(voteForID)
+        if previous is not target:
+            # If player already voted for someone, remove that vote first
+            if previous:
+                self.changeVotes(previous, -1)
+                changes.append((previous, -1))
+            if target:
+                self.changeVotes(target, 1)
+                changes.append((target, 1))
+        if firstVote:
+            self.votesIn += 1
+        self.voteSeq += 1
+        return changes
+
+    def changeVotes(self, player: Player, delta: int):
+        if self.audience:
+            votes = self.audience.change_votes(player.id, delta)
+            if votes > self.maxVotes:
+                self.maxVotes = votes
+            elif votes - delta == self.maxVotes:
+                self.maxVotes = self.audience.max_votes()
+            return
+        oldVotes = player.votes
+        player.votes += delta
+        self._moveVotes(player, oldVotes)
+
+    def _moveVotes(self, player: Player, oldVotes):
+        # Moves player from the oldVotes bucket to its current one (None when removed)
+        if oldVotes is None:
+            bucket = self.voteBuckets[player.votes]
+            bucket.discard(player.id)
+        else:
+            bucket = self.voteBuckets[oldVotes]
+            bucket.discard(player.id)
+            self.voteBuckets.setdefault(player.votes, set()).add(player.id)
+            self.maxVotes = max(self.maxVotes, player.votes)
+        # Walk down past emptied buckets, only ever a step or two
+        while self.maxVotes > 0 and not self.voteBuckets.get(self.maxVotes):
+            self.voteBuckets.pop(self.maxVotes, None)
+            self.maxVotes -= 1
+
+    def isVoteTie(self) -> bool:
+        if self.audience:
+            return self.audience.is_tie()
+        return len(self.voteBuckets.get(self.maxVotes, ())) > 1
+
+    def voteLeader(self) -> Player | None:
+        #player with the most votes, None if nobody has a vote yet
+        if self.audience:
+            leaderID = self.audience.leader()
+            return self.playersById[leaderID] if leaderID else None
+        if self.maxVotes == 0:
+            return None
+        leaders = self.voteBuckets[self.maxVotes]
+        if len(leaders) == 1:
+            return self.playersById[next(iter(leaders))]
+        # Tie, keep the roster order the old scan used
+        for p in self.loPlayers:
+            if p.id in leaders:
+                return p
+
+    def resetVotes(self):
+        if self.audience:
+            self.audience.reset_votes()
+        else:
+            for p in self.loPlayers:
+                p.votes = 0
+                p.has_voted = False
+                p.voted_for_id = None
+            self.voteBuckets = {0: set(self.playersById)}
+        self.votesIn = 0
+        self.maxVotes = 0
+        #bumped, not reset, so delta clients never see a seq go backwards
+        self.voteSeq += 1
+
+    def resetReadyToStart(self):
+        if self.audience:
+            self.audience.reset_ready_start()
+        else:
+            for p in self.loPlayers:
+                p.ready_to_start = False
+        self.readyToStartCount = 0
+
+    def resetReady(self):
+        if self.audience:
+            self.audience.reset_ready_vote()
+        else:
+            for p in self.loPlayers:
+                p.ready_to_vote = False
+        self.readyToVoteCount = 0
+        self.resetReadyToStart()
+
+    def resetRound(self, points=False):
+        #votes and ready flags back to the start of a round in one pass,
+        #points too when a whole new game starts
+        if self.audience:
+            self.audience.reset()
+            if points:
+                for p in self.loPlayers:
+                    p.points = 0
+        else:
+            for p in self.loPlayers:
+                p.reset_round()
+                if points:
+                    p.points = 0
+            self.voteBuckets = {0: set(self.playersById)}
+        self.readyToVoteCount = 0
+        self.readyToStartCount = 0
+        self.votesIn = 0
+        self.maxVotes = 0
+        self.voteSeq += 1
+
+    def updateRoundMode(self):
+        #called when a session starts, rooms of AUDIENCE_THRESHOLD players or
+        #more keep votes and ready flags in packed arrays instead of on each Player
+        big = len(self.loPlayers) >= AUDIENCE_THRESHOLD
+        if big and not self.audience:
+            self.audience = AudienceRound(self.loPlayers)
+            self.voteBuckets = {}
+        elif not big and self.audience:
+            self.syncPlayers()
+            self.audience = None
+            self.voteBuckets = {}
+            for p in self.loPlayers:
+                self.voteBuckets.setdefault(p.votes, set()).add(p.id)
+
+    def syncPlayers(self):
+        #copies the packed round state back onto the Player objects
+        if self.audience:
+            self.audience.write_back(self.playersById)
+
+    def checkCounters(self):
+        #recounts everything from the players and fails if a counter drifted
+        self.syncPlayers()
+        expected = {
+            "readyToVoteCount": sum(1 for p in self.loPlayers if p.ready_to_vote),
+            "readyToStartCount": sum(1 for p in self.loPlayers if p.ready_to_start),
+            "votesIn": sum(1 for p in self.loPlayers if p.has_voted),
+            "maxVotes": max((p.votes for p in self.loPlayers), default=0),
+        }
+        actual = {name: getattr(self, name) for name in expected}
+        buckets = {}
+        for p in self.loPlayers:
+            buckets.setdefault(p.votes, set()).add(p.id)
+        nonEmpty = {votes: ids for votes, ids in self.voteBuckets.items() if ids}
+        if self.audience:
+            #the arrays stand in for the buckets
+            nonEmpty = buckets
+        if actual != expected or nonEmpty != buckets:
+            raise AssertionError(f"Counters drifted in game {self.gameID}: {actual} != {expected}, {nonEmpty} != {buckets}")
 
     def nextPhase(self):
         match self.phase:
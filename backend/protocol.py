@@ -0,0 +1,149 @@
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Websocket messages look like {"type": ..., "data": {...}}. Each type is
+# registered with @route together with the fields its handler takes, so a
+# frame is size-checked, decoded and turned into handler arguments in the
+# receive loop, and a bad one never reaches the game's actor.
+#
+# Clients connecting with ?msgpack=true may send binary msgpack frames and
+# get every frame back as msgpack. Without msgpack installed the option is
+# ignored and the client gets text frames as usual.
+
+MAX_FRAME_BYTES = int(os.environ.get("MAX_FRAME_BYTES", 4096))
+BINARY_FRAMES = msgpack is not None
+
+loads = orjson.loads if orjson else json.loads
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+class FrameTooLarge(ProtocolError):
+    pass
+
+
+class Field:
+    __slots__ = ("types", "default", "minimum", "maximum", "max_length", "arg", "secret")
+
+    def __init__(self, types, default=None, minimum: int = None, maximum: int = None, max_length: int = None, arg: str = None, secret: bool = False):
+        # A missing or null field gets default. arg is the handler's
+        # parameter name when it differs from the field's. A secret field
+        # (a passcode) is left out of logs.
+        self.types = types if isinstance(types, tuple) else (types,)
+        self.default = default
+        self.minimum = minimum
+        self.maximum = maximum
+        self.max_length = max_length
+        self.arg = arg
+        self.secret = secret
+
+    def check(self, name: str, value):
+        if value is None:
+            return self.default
+        # bool is an int to isinstance, but true is not a round count
+        if not isinstance(value, self.types) or (value is True or value is False) and bool not in self.types:
+            raise ProtocolError(f"{name} must be {' or '.join(t.__name__ for t in self.types)}")
+        if self.minimum is not None and value < self.minimum:
+            raise ProtocolError(f"{name} must be at least {self.minimum}")
+        if self.maximum is not None and value > self.maximum:
+            raise ProtocolError(f"{name} must be at most {self.maximum}")
+        if self.max_length is not None and len(value) > self.max_length:
+            raise ProtocolError(f"{name} is longer than {self.max_length}")
+        return value
+
+
+class Route:
+    __slots__ = ("type", "handler", "fields", "secrets")
+
+    def __init__(self, message_type: str, handler, fields: dict[str, Field]):
+        self.type = message_type
+        self.handler = handler
+        self.fields = fields
+        self.secrets = frozenset(name for name, field in fields.items() if field.secret)
+
+
+class Command:
+    # A checked message, ready for route.handler(game_id, player_id, **args)
+    __slots__ = ("route", "args", "message")
+
+    def __init__(self, route: Route, args: dict, message: dict):
+        self.route = route
+        self.args = args
+        self.message = message
+
+    def redacted(self) -> dict:
+        # The message without its secret fields, for the event log and errors
+        if not self.route.secrets:
+            return self.message
+        data = self.message.get("data") or {}
+        return {**self.message, "data": {key: value for key, value in data.items() if key not in self.route.secrets}}
+
+    def __repr__(self):
+        return repr(self.redacted())
+
+
+# message type -> Route
+routes: dict[str, Route] = {}
+
+
+def route(message_type: str, **fields: Field):
+    # @route("change_timer", new_time=Field(int, default=30))
+    def register(handler):
+        routes[message_type] = Route(message_type, handler, fields)
+        return handler
+    return register
+
+
+def load(frame: str | bytes, binary: bool) -> dict:
+    # binary: the connection negotiated msgpack
+    size = len(frame) if isinstance(frame, bytes) else len(frame.encode())
+    if size > MAX_FRAME_BYTES:
+        raise FrameTooLarge(f"frame of {size} bytes, the limit is {MAX_FRAME_BYTES}")
+    if isinstance(frame, bytes):
+        if not binary:
+            raise ProtocolError("binary frames need ?msgpack=true")
+        try:
+            message = msgpack.unpackb(frame)
+        except Exception:
+            raise ProtocolError("frame is not valid msgpack")
+    else:
+        try:
+            message = loads(frame)
+        except ValueError:
+            raise ProtocolError("frame is not valid JSON")
+    if not isinstance(message, dict) or not isinstance(message.get("type"), str):
+        raise ProtocolError("expected an object with a type")
+    return message
+
+
+def parse(message: dict) -> Command:
+    route = routes.get(message["type"])
+    if route is None:
+        raise ProtocolError("unknown message type")
+    data = message.get("data")
+    if data is None:
+        data = {}
+    elif not isinstance(data, dict):
+        raise ProtocolError("data must be an object")
+    # Fields a handler doesn't know are ignored, so clients can run ahead
+    args = {}
+    for name, field in route.fields.items():
+        args[field.arg or name] = field.check(name, data.get(name))
+    return Command(route, args, message)
+
+
+def pack(frame: bytes) -> bytes:
+    # A JSON frame from encode_message as msgpack, for binary connections
+    return msgpack.packb(loads(frame))
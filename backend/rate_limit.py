@@ -0,0 +1,99 @@
+import os
+
+# Token buckets for inbound websocket messages, checked in the receive loop
+# before a message is queued for its game. Every connection has a bucket per
+# message type and every room one bucket for all its sockets together, so a
+# client sending end_turn in a loop can't keep the room's actor (and the
+# broadcasts each message causes) busy for everyone else. Buckets only
+# refill when a message arrives, nothing runs in between.
+#
+# Limits are "rate/burst" in messages per second, per type for a connection
+# and for everything a room sends, and 0 turns one off:
+#
+#   RATE_LIMITS="submit_vote=5/10,default=20/40" ROOM_RATE_LIMIT="1000/2000"
+
+DEFAULT_LIMITS = {
+    "default": (10, 20),
+    "submit_vote": (5, 10),
+    "toggle_ready": (5, 10),
+    "toggle_ready_start": (5, 10),
+    "vote_snapshot": (2, 5),
+    # Fetches a fresh word list from Claude
+    "new_game": (0.5, 2),
+}
+DEFAULT_ROOM_LIMIT = "1000/2000"
+
+
+def parse_limit(text: str) -> tuple[float, float] | None:
+    text = text.strip()
+    if text in ("", "0"):
+        return None
+    rate, _, burst = text.partition("/")
+    return float(rate), float(burst or rate)
+
+
+def parse_limits(text: str) -> dict:
+    limits = dict(DEFAULT_LIMITS)
+    for item in filter(None, text.split(",")):
+        message_type, _, limit = item.partition("=")
+        limits[message_type.strip()] = parse_limit(limit)
+    return limits
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = now
+
+    def take(self, now: float) -> bool:
+        tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if tokens < 1:
+            self.tokens = tokens
+            return False
+        self.tokens = tokens - 1
+        return True
+
+
+class RateLimiter:
+    def __init__(self, limits: dict, room_limit: tuple[float, float] | None):
+        # message type -> (rate, burst) or None, "default" for the rest
+        self.limits = limits
+        self.room_limit = room_limit
+        # game_id -> TokenBucket
+        self.rooms = {}
+        # Messages dropped so far, read by /metrics
+        self.dropped_connection = 0
+        self.dropped_room = 0
+
+    def allow(self, buckets: dict, game_id: str, message_type: str, now: float) -> bool:
+        # buckets is the connection's own message type -> TokenBucket, kept
+        # by its receive loop
+        bucket = buckets.get(message_type)
+        if bucket is None:
+            limit = self.limits.get(message_type, self.limits.get("default"))
+            if limit is not None:
+                bucket = buckets[message_type] = TokenBucket(*limit, now)
+        if bucket is not None and not bucket.take(now):
+            self.dropped_connection += 1
+            return False
+
+        if self.room_limit is None:
+            return True
+        room = self.rooms.get(game_id)
+        if room is None:
+            room = self.rooms[game_id] = TokenBucket(*self.room_limit, now)
+        if not room.take(now):
+            self.dropped_room += 1
+            return False
+        return True
+
+    def forget(self, game_id: str):
+        self.rooms.pop(game_id, None)
+
+
+limiter = RateLimiter(parse_limits(os.environ.get("RATE_LIMITS", "")), parse_limit(os.environ.get("ROOM_RATE_LIMIT", DEFAULT_ROOM_LIMIT)))
@@ -0,0 +1,115 @@
+import asyncio
+import itertools
+from contextlib import suppress
+
+import httpx
+import websockets
+from fastapi import FastAPI, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+
+from sharding import ring, workers
+
+# Front router for sticky sharding. Every request for a room goes to the
+# worker owning its game ID, so each worker keeps a plain active_games dict
+# of its own rooms. Run the workers with SHARD_NAME and the same
+# SHARD_WORKERS, then put this in front:
+#
+#   SHARD_NAME=w0 SHARD_WORKERS=w0=127.0.0.1:8001,w1=127.0.0.1:8002 uvicorn main:app --port 8001
+#   SHARD_NAME=w1 SHARD_WORKERS=w0=127.0.0.1:8001,w1=127.0.0.1:8002 uvicorn main:app --port 8002
+#   SHARD_WORKERS=w0=127.0.0.1:8001,w1=127.0.0.1:8002 uvicorn router:app --port $PORT
+
+if ring is None:
+    raise RuntimeError("router.py needs SHARD_WORKERS, e.g. w0=127.0.0.1:8001,w1=127.0.0.1:8002")
+
+app = FastAPI()
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+client = httpx.AsyncClient(timeout=30)
+# New players have no ID yet, spread them across the workers
+next_worker = itertools.cycle(list(workers))
+
+
+def worker_for(key: str = None) -> str:
+    name = ring.owner(key) if key else next(next_worker)
+    return workers[name]
+
+
+def routing_key(path: str, params) -> str | None:
+    # Rooms are keyed by game ID, game creation by the host (whose worker
+    # then hands out a game ID it owns), registration by nobody
+    if "game_id" in params:
+        return params["game_id"]
+    parts = path.strip("/").split("/")
+    if len(parts) == 3 and parts[0] == "game" and parts[2] == "state":
+        return parts[1]
+    if len(parts) == 2 and parts[0] == "player" and parts[1] != "register":
+        return parts[1]
+    if "host_id" in params:
+        return params["host_id"]
+    return None
+
+
+@app.post("/game/join")
+async def join_game_forward(request: Request):
+    params = dict(request.query_params)
+    # Without both IDs worker_for would pick any worker, fail here instead
+    if not params.get("player_id") or not params.get("game_id"):
+        return JSONResponse({"error": "player_id and game_id are required"}, status_code=400)
+    # The player may be registered on another worker, carry their name over
+    player = await client.get(f"http://{worker_for(params['player_id'])}/player/{params['player_id']}")
+    name = player.json().get("name")
+    if name:
+        params["name"] = name
+    response = await client.post(f"http://{worker_for(params['game_id'])}/game/join", params=params)
+    return Response(response.content, response.status_code, media_type="application/json")
+
+
+@app.api_route("/{path:path}", methods=["GET", "POST"])
+async def forward(request: Request, path: str):
+    worker = worker_for(routing_key(path, request.query_params))
+    response = await client.request(request.method, f"http://{worker}/{path}", params=request.query_params, content=await request.body())
+    return Response(response.content, response.status_code, media_type=response.headers.get("content-type"))
+
+
+@app.websocket("/ws/{game_id}/{player_id}")
+async def forward_ws(websocket: WebSocket, game_id: str, player_id: str):
+    await websocket.accept()
+    query = f"?{websocket.url.query}" if websocket.url.query else ""
+    url = f"ws://{worker_for(game_id)}/ws/{game_id}/{player_id}{query}"
+
+    async with websockets.connect(url) as upstream:
+        async def client_to_worker():
+            try:
+                while True:
+                    received = await websocket.receive()
+                    if received["type"] == "websocket.disconnect":
+                        return
+                    # msgpack clients send binary frames
+                    text = received.get("text")
+                    await upstream.send(text if text is not None else received.get("bytes") or b"")
+            except WebSocketDisconnect:
+                pass
+
+        async def worker_to_client():
+            async for message in upstream:
+                if isinstance(message, bytes):
+                    await websocket.send_bytes(message)
+                else:
+                    await websocket.send_text(message)
+
+        # Whichever side closes first ends the pair
+        tasks = [asyncio.create_task(client_to_worker()), asyncio.create_task(worker_to_client())]
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in tasks:
+            task.cancel()
+
+    with suppress(Exception):
+        await websocket.close()
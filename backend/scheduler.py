@@ -0,0 +1,82 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+# One task and one heap for every timer in the process, instead of a
+# sleeping task per game. Timers have a key, scheduling a key again replaces
+# its timer and cancelling just forgets it; stale heap entries are skipped
+# when they come up.
+
+
+class Scheduler:
+    def __init__(self):
+        # (when, seq, key), seq tells a live entry from a replaced one
+        self.heap = []
+        # key -> (when, seq, callback)
+        self.timers = {}
+        self.counter = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.task: asyncio.Task = None
+        # Tasks started by coroutine callbacks, the loop only keeps weak references
+        self.running = set()
+
+    async def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+        for task in self.running:
+            task.cancel()
+
+    def schedule(self, key, delay: float, callback):
+        # callback() runs on the scheduler task, so it should be quick. If it
+        # returns a coroutine that is run as its own task.
+        when = time.monotonic() + delay
+        seq = next(self.counter)
+        self.timers[key] = (when, seq, callback)
+        heapq.heappush(self.heap, (when, seq, key))
+        if self.heap[0][1] == seq:
+            # New earliest deadline, the loop is sleeping for too long
+            self.wakeup.set()
+
+    def cancel(self, key):
+        self.timers.pop(key, None)
+
+    async def run(self):
+        while True:
+            now = time.monotonic()
+            while self.heap and self.heap[0][0] <= now:
+                _, seq, key = heapq.heappop(self.heap)
+                timer = self.timers.get(key)
+                if timer is None or timer[1] != seq:
+                    continue
+                del self.timers[key]
+                self.fire(key, timer[2])
+
+            # Rescheduling leaves old entries behind, drop them once they dominate
+            if len(self.heap) > 2 * len(self.timers) + 64:
+                self.heap = [(when, seq, key) for key, (when, seq, _) in self.timers.items()]
+                heapq.heapify(self.heap)
+
+            self.wakeup.clear()
+            timeout = self.heap[0][0] - now if self.heap else None
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def fire(self, key, callback):
+        try:
+            result = callback()
+        except Exception as e:
+            print(f"Timer {key!r} failed: {e!r}")
+            return
+        if asyncio.iscoroutine(result):
+            task = asyncio.create_task(result)
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+
+scheduler = Scheduler()
@@ -0,0 +1,49 @@
+import bisect
+import hashlib
+import os
+
+# Optional sticky sharding: every room lives on exactly one worker, picked by
+# hashing its game ID onto a consistent-hash ring. Workers are listed in
+# SHARD_WORKERS as "name=host:port,..." and each one knows its own SHARD_NAME.
+# With neither set there is one worker that owns everything.
+
+REPLICAS = 100
+
+
+def hash_key(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    # Each worker gets REPLICAS points on the ring, a key belongs to the next
+    # point clockwise. Adding a worker only moves the keys it takes over.
+    def __init__(self, workers, replicas: int = REPLICAS):
+        points = sorted((hash_key(f"{worker}#{i}"), worker) for worker in workers for i in range(replicas))
+        self.hashes = [h for h, _ in points]
+        self.workers = [w for _, w in points]
+
+    def owner(self, key: str) -> str:
+        i = bisect.bisect(self.hashes, hash_key(key)) % len(self.hashes)
+        return self.workers[i]
+
+
+def load_workers(spec: str = None) -> dict[str, str]:
+    # "w0=127.0.0.1:8001,w1=127.0.0.1:8002" -> {"w0": "127.0.0.1:8001", ...}
+    workers = {}
+    for entry in (spec or "").split(","):
+        if "=" in entry:
+            name, address = entry.split("=", 1)
+            workers[name.strip()] = address.strip()
+    return workers
+
+
+workers = load_workers(os.environ.get("SHARD_WORKERS"))
+ring = HashRing(workers) if workers else None
+this_worker = os.environ.get("SHARD_NAME")
+
+
+def owns(key: str) -> bool:
+    # Whether this worker should hand out the given game or player ID
+    if ring is None or this_worker is None:
+        return True
+    return ring.owner(key) == this_worker
@@ -0,0 +1,68 @@
+import json
+import os
+import random
+
+WORDS_PATH = os.path.join(os.path.dirname(__file__), "words.json")
+
+
+class WordBank:
+    # The default words kept in memory. words.json is parsed once and only
+    # read again when its mtime changes, so sampling never touches the disk.
+    def __init__(self, path: str = WORDS_PATH):
+        self.path = path
+        self.mtime = None
+        self.words: list[str] = []
+        self.index: dict[str, int] = {}
+        self.categories: dict[str, list[int]] = {}
+
+    def load(self):
+        mtime = os.stat(self.path).st_mtime
+        with open(self.path, "r") as f:
+            word_data = json.load(f)
+
+        words = []
+        index = {}
+        categories = {}
+        for category, category_words in word_data.items():
+            positions = []
+            for word in category_words:
+                if word not in index:
+                    index[word] = len(words)
+                    words.append(word)
+                positions.append(index[word])
+            categories[category] = positions
+
+        self.words, self.index, self.categories = words, index, categories
+        self.mtime = mtime
+
+    def reload_if_changed(self):
+        if self.mtime is None or os.stat(self.path).st_mtime != self.mtime:
+            self.load()
+
+    def sample(self, count: int, used_words, category: str = None) -> list[str]:
+        self.reload_if_changed()
+        pool = self.categories.get(category) if category else None
+        size = len(pool) if pool is not None else len(self.words)
+        used = {self.index[w] for w in used_words if w in self.index}
+
+        if len(used) + count * 2 > size:
+            # Bank nearly exhausted, just list what is left
+            positions = pool if pool is not None else range(size)
+            available = [i for i in positions if i not in used]
+            chosen = random.sample(available, min(count, len(available)))
+        else:
+            # Rejection sampling on indices, O(count) expected since at most half is taken
+            chosen = []
+            picked = set(used)
+            while len(chosen) < count:
+                i = random.randrange(size)
+                if pool is not None:
+                    i = pool[i]
+                if i not in picked:
+                    picked.add(i)
+                    chosen.append(i)
+
+        return [self.words[i] for i in chosen]
+
+
+default_words = WordBank()
@@ -0,0 +1,115 @@
+import asyncio
+import random
+import time
+from collections import OrderedDict
+
+from claude_service import generate_secret_word
+from metrics import timer, word_generation_seconds
+
+# Words asked from Claude per request, a few games' worth at once
+BATCH_SIZE = 30
+# Start fetching the next batch once a game has fewer unseen words than this left
+LOW_WATER = 10
+# Stop growing a category past this, it also bounds the exclusion list in the prompt
+MAX_WORDS = 150
+TTL_SECONDS = 60 * 60
+MAX_CATEGORIES = 500
+
+
+def normalize_category(category: str) -> str:
+    return " ".join(category.lower().split())
+
+
+class CategoryWords:
+    # Every word fetched so far for one category, shared by all games using it
+    def __init__(self, category: str):
+        self.category = category
+        self.words: list[str] = []
+        self.seen: set[str] = set()
+        self.created = time.monotonic()
+        self.refill: asyncio.Task = None
+
+    def add(self, words: list[str]):
+        for word in words:
+            key = word.lower()
+            if key not in self.seen:
+                self.seen.add(key)
+                self.words.append(word)
+
+    def unused(self, used: set[str]) -> list[str]:
+        return [w for w in self.words if w.lower() not in used]
+
+
+class CategoryWordPool:
+    # Process-wide LRU + TTL cache of generated words keyed by category.
+    # Games playing the same category draw from one pool instead of each
+    # calling Claude, and a new batch is prefetched before the pool runs dry.
+    def __init__(self, fetch=generate_secret_word, batch_size: int = BATCH_SIZE, low_water: int = LOW_WATER,
+                 max_words: int = MAX_WORDS, ttl_seconds: float = TTL_SECONDS, max_categories: int = MAX_CATEGORIES):
+        self.fetch = fetch
+        self.batch_size = batch_size
+        self.low_water = low_water
+        self.max_words = max_words
+        self.ttl_seconds = ttl_seconds
+        self.max_categories = max_categories
+        self.categories: OrderedDict[str, CategoryWords] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+
+    async def take(self, category: str, count: int, used_words: list[str]) -> list[str]:
+        entry = self.get_entry(category)
+        used = {w.lower() for w in used_words}
+        available = entry.unused(used)
+
+        if len(available) < count:
+            # Not enough for this game yet, wait for the (possibly shared) fetch
+            self.misses += 1
+            refill = self.start_refill(entry)
+            if refill:
+                await asyncio.shield(refill)
+                available = entry.unused(used)
+        else:
+            self.hits += 1
+            if len(available) - count < self.low_water:
+                self.start_refill(entry)
+
+        return random.sample(available, min(count, len(available)))
+
+    def get_entry(self, category: str) -> CategoryWords:
+        key = normalize_category(category)
+        entry = self.categories.get(key)
+        if entry and time.monotonic() - entry.created > self.ttl_seconds:
+            entry = None
+
+        if entry is None:
+            entry = CategoryWords(category)
+            self.categories[key] = entry
+            while len(self.categories) > self.max_categories:
+                self.categories.popitem(last=False)
+
+        self.categories.move_to_end(key)
+        return entry
+
+    def start_refill(self, entry: CategoryWords) -> asyncio.Task:
+        # At most one fetch in flight per category, everyone else waits on it
+        if entry.refill is None and len(entry.words) < self.max_words:
+            entry.refill = asyncio.create_task(self.fetch_batch(entry))
+            entry.refill.add_done_callback(self.log_failure)
+        return entry.refill
+
+    async def fetch_batch(self, entry: CategoryWords):
+        try:
+            self.fetches += 1
+            with timer(word_generation_seconds):
+                words = await self.fetch(entry.category, self.batch_size, entry.words)
+            entry.add(words)
+        finally:
+            entry.refill = None
+
+    def log_failure(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception():
+            print(f"Prefetching words failed: {task.exception()!r}")
+
+
+category_pool = CategoryWordPool()
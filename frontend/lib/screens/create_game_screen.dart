@@ -36,8 +36,8 @@ class _CreateGameScreenState extends State<CreateGameScreen> {
 
     final gameId = await _apiService.createGame(
       hostId: widget.playerId,
-      maxRound: int.tryParse(_roundsController.text) ?? 3,
-      clueTime: int.tryParse(_timerController.text) ?? 30,
+      maxRound: (int.tryParse(_roundsController.text) ?? 3).clamp(1, ApiService.maxRounds),
+      clueTime: (int.tryParse(_timerController.text) ?? 30).clamp(0, ApiService.maxClueTimer),
       secretCategory: _categoryController.text.trim(),
       passcode: _passcodeController.text.trim(),
     );
@@ -206,6 +206,14 @@ class _GameScreenState extends State<GameScreen> {
         }
         break;
 
+      case 'rate_limited':
+        // The server dropped a message we sent, undo the ready flip we made for it
+        final dropped = data['message_type'];
+        if (dropped == 'toggle_ready' || dropped == 'toggle_ready_start') {
+          setState(() => _isReady = !_isReady);
+        }
+        break;
+
       case 'timer_changed':
         setState(() {
           _session?.clueTimer = data['new_time'];
@@ -287,13 +295,20 @@ class _GameScreenState extends State<GameScreen> {
     final category = _newCategoryController.text.trim();
     final passcode = _newPasscodeController.text.trim();
 
-    if (rounds == null || rounds <= 0) {
+    if (rounds == null || rounds <= 0 || rounds > ApiService.maxRounds) {
       ScaffoldMessenger.of(context).showSnackBar(
         const SnackBar(content: Text('Please enter a valid number of rounds')),
       );
       return;
     }
 
+    if (timer != null && (timer < 0 || timer > ApiService.maxClueTimer)) {
+      ScaffoldMessenger.of(context).showSnackBar(
+        const SnackBar(content: Text('Please enter a valid timer')),
+      );
+      return;
+    }
+
     widget.webSocketService.sendMessage({
       'type': 'new_game',
       'data': {
@@ -1302,7 +1317,7 @@ class _GameScreenState extends State<GameScreen> {
   void _changeTimer(int newTime) {
     widget.webSocketService.sendMessage({
       'type': 'change_timer',
-      'data': {'new_time': newTime},
+      'data': {'new_time': newTime.clamp(0, ApiService.maxClueTimer)},
     });
   }
 
@@ -5,6 +5,10 @@ class ApiService {
   // Change this to your server's IP if testing on a real phone
   static const String baseUrl = 'https://impostor-game-production-b1a9.up.railway.app';
 
+  // Same limits as the server's
+  static const int maxRounds = 100;
+  static const int maxClueTimer = 600;
+
   // Register a new player
   Future<String?> registerPlayer(String name) async {
     final response = await http.post(
@@ -8,12 +8,17 @@ class WebSocketService {
   Function(Map<String, dynamic>)? onMessageReceived;
 
   void connect(String gameId, String playerId) {
-    final uri = Uri.parse('$baseUrl/ws/$gameId/$playerId');
+    // heartbeat=true: the server pings now and then and drops us if we stop answering
+    final uri = Uri.parse('$baseUrl/ws/$gameId/$playerId?heartbeat=true');
     _channel = WebSocketChannel.connect(uri);
 
     _channel!.stream.listen(
       (data) {
         final message = jsonDecode(data);
+        if (message['type'] == 'ping') {
+          sendMessage({'type': 'pong'});
+          return;
+        }
         if (onMessageReceived != null) {
           onMessageReceived!(message);
         }
@@ -0,0 +1,58 @@
+import os
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from connection_manager import encode_message, orjson
+
+# Compares the encoding work of one vote_update broadcast when every socket
+# encodes the message itself (send_json) against encoding it once up front.
+
+ROOM_SIZES = [3, 10, 50, 200]
+ROUNDS = 200
+
+
+def vote_update(room_size: int) -> dict:
+    tally = [{"id": f"P{i:05d}", "name": f"Player {i}", "votes": i % 3} for i in range(room_size)]
+    return {
+        "type": "vote_update",
+        "data": {
+            "voter_id": "P00000",
+            "voted_for_id": "P00001",
+            "votes_in": room_size,
+            "total_players": room_size,
+            "vote_tally": tally
+        }
+    }
+
+
+def per_socket(message: dict, sockets: int) -> int:
+    # What websocket.send_json does for every connection in the room
+    encoded = 0
+    for _ in range(sockets):
+        encoded += len(json.dumps(message, separators=(",", ":"), ensure_ascii=False).encode())
+    return encoded
+
+
+def serialize_once(message: dict, sockets: int) -> int:
+    return len(encode_message(message))
+
+
+def run(fn, message: dict, sockets: int) -> tuple[int, float]:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        encoded = fn(message, sockets)
+    elapsed = (time.perf_counter() - start) / ROUNDS
+    return encoded, elapsed * 1e6
+
+
+if __name__ == "__main__":
+    print(f"encoder: {'orjson' if orjson else 'json'}")
+    print(f"{'players':>8} {'before bytes':>13} {'after bytes':>12} {'before us':>10} {'after us':>9}")
+    for size in ROOM_SIZES:
+        message = vote_update(size)
+        before_bytes, before_us = run(per_socket, message, size)
+        after_bytes, after_us = run(serialize_once, message, size)
+        print(f"{size:>8} {before_bytes:>13} {after_bytes:>12} {before_us:>10.1f} {after_us:>9.1f}")
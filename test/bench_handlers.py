@@ -0,0 +1,232 @@
+import os
+import sys
+import asyncio
+import random
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import game_manager
+import main
+from models import GamePhase, Player
+from word_pool import category_pool
+
+# Benchmarks for game_manager and the main.handle_* handlers, with the
+# ConnectionManager and Claude stubbed out so only our own code is timed.
+# Not collected by a plain `pytest test`, run it by name:
+#
+#   pip install pytest-benchmark
+#   python -m pytest test/bench_handlers.py --benchmark-storage=test/.benchmarks --benchmark-min-rounds=50 \
+#       --benchmark-compare=0001_baseline --benchmark-compare-fail=min:100%
+#
+# which fails if any benchmark's best time doubled against the stored
+# baseline. That is looser than it sounds: the baseline comes from a small
+# shared VM where identical runs differ by up to 1.9x, and the regressions
+# this is for (a scan per player, a re-encode per socket) cost far more than
+# 2x at 500 players. On a quiet machine save your own baseline with
+# --benchmark-save=baseline and tighten the threshold.
+
+ROOM_SIZES = [3, 50, 500]
+GAME_COUNTS = [1, 1_000, 100_000]
+
+
+class StubManager:
+    # Does the encoding work the real one does, but sends nothing
+    def __init__(self):
+        self.frames = 0
+
+    async def broadcast_raw(self, game_id, frame):
+        self.frames += 1
+
+    async def send_raw(self, game_id, player_id, frame):
+        self.frames += 1
+
+    async def broadcast_to_game(self, game_id, message):
+        await self.broadcast_raw(game_id, main.encode_message(message))
+
+    async def send_to_player(self, game_id, player_id, message):
+        await self.send_raw(game_id, player_id, main.encode_message(message))
+
+    async def broadcast_for_feature(self, game_id, feature, frame, fallback):
+        # A room with legacy clients builds the full tally too
+        fallback()
+        self.frames += 1
+
+    async def broadcast_with_overrides(self, game_id, frame, overrides):
+        self.frames += 1
+
+    async def broadcast_coalesced(self, game_id, key, build):
+        await build()
+
+    async def flush(self, game_id):
+        pass
+
+    def close_game(self, game_id):
+        pass
+
+
+async def stub_generate_secret_word(category, count, used_words):
+    return [f"{category} word {i}" for i in range(count)]
+
+
+@pytest.fixture(autouse=True)
+def stubs(monkeypatch):
+    monkeypatch.setattr(main, "manager", StubManager())
+    monkeypatch.setattr(category_pool, "fetch", stub_generate_secret_word)
+    monkeypatch.setattr(game_manager, "active_games", {})
+    monkeypatch.setattr(game_manager, "active_players", {})
+    monkeypatch.setattr(game_manager, "expiry_heap", [])
+    monkeypatch.setattr(main, "active_games", game_manager.active_games)
+    monkeypatch.setattr(main, "active_players", game_manager.active_players)
+    main.pending_votes.clear()
+    random.seed(1234)
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def make_room(loop, size: int, category: str = "") -> tuple[str, list[str]]:
+    host = game_manager.register_player("Host")
+    game_id = game_manager.create_game(host, 3, 0, category)
+    ids = [host]
+    for i in range(size - 1):
+        player_id = game_manager.register_player(f"Player {i}")
+        game_manager.join_game(player_id, game_id)
+        ids.append(player_id)
+    loop.run_until_complete(game_manager.start_game(game_id))
+    loop.run_until_complete(game_manager.start_session(game_id))
+    return game_id, ids
+
+
+def fill_games(count: int):
+    # Other rooms on the server, which lookups and ID generation have to live with
+    for _ in range(count - 1):
+        host = game_manager.register_player("Host")
+        game_id = game_manager.create_game(host, 3, 0, "")
+        for i in range(2):
+            game_manager.join_game(game_manager.register_player(f"Player {i}"), game_id)
+
+
+@pytest.mark.parametrize("games", GAME_COUNTS)
+def test_create_and_join(benchmark, games):
+    fill_games(games)
+
+    def create_and_join():
+        host = game_manager.register_player("Host")
+        game_id = game_manager.create_game(host, 3, 0, "")
+        game_manager.join_game(game_manager.register_player("Guest"), game_id)
+
+    benchmark(create_and_join)
+
+
+@pytest.mark.parametrize("games", GAME_COUNTS)
+def test_cleanup_sweep(benchmark, games):
+    # Nothing has expired, the sweep should only peek at the heap
+    fill_games(games)
+    benchmark(game_manager.cleanup_inactive_games, 5)
+
+
+@pytest.mark.parametrize("size", ROOM_SIZES)
+def test_create_impostor_schedule(benchmark, size):
+    # More rounds than players, so the schedule has to be topped up
+    players = [Player(f"Player {i}", str(i)) for i in range(size)]
+    benchmark(game_manager.createImpostorSchedule, players, size + size // 2)
+
+
+@pytest.mark.parametrize("used", [0, 50, 250])
+def test_load_default_words(benchmark, used):
+    # Words already used in the game have to be skipped
+    game_manager.default_words.load()
+    used_words = game_manager.default_words.words[:used]
+    benchmark(game_manager.load_default_words, 5, used_words)
+
+
+@pytest.mark.parametrize("size", ROOM_SIZES)
+def test_submit_vote(benchmark, loop, size):
+    game_id, ids = make_room(loop, size)
+    votes = iter(range(10**9))
+    benchmark(lambda: game_manager.submit_vote(game_id, ids[0], ids[next(votes) % size]))
+
+
+@pytest.mark.parametrize("size", ROOM_SIZES)
+def test_start_session(benchmark, loop, size):
+    game_id, _ = make_room(loop, size, "animals")
+    game = game_manager.active_games[game_id]
+
+    def setup():
+        game.impostorSchedule = list(game.loPlayers)
+        game.wordsAvailable = [f"word {i}" for i in range(5)]
+
+    benchmark.pedantic(lambda: loop.run_until_complete(game_manager.start_session(game_id)), setup=setup, rounds=200)
+
+
+@pytest.mark.parametrize("size", ROOM_SIZES)
+def test_end_session(benchmark, loop, size):
+    game_id, ids = make_room(loop, size)
+    game = game_manager.active_games[game_id]
+
+    def setup():
+        for voter in game.loPlayers:
+            game.castVote(voter, ids[0])
+
+    benchmark.pedantic(game_manager.end_session, args=(game_id,), setup=setup, rounds=200)
+
+
+@pytest.mark.parametrize("size", ROOM_SIZES)
+def test_handle_vote(benchmark, loop, size):
+    game_id, ids = make_room(loop, size)
+    votes = iter(range(10**9))
+
+    def vote():
+        i = next(votes)
+        loop.run_until_complete(main.handle_vote(game_id, ids[i % size], ids[(i * 7 + 1) % size]))
+
+    benchmark(vote)
+
+
+@pytest.mark.parametrize("size", ROOM_SIZES)
+def test_handle_toggle_ready(benchmark, loop, size):
+    game_id, ids = make_room(loop, size)
+    # Two players keep toggling, so the room never goes to voting
+    toggles = iter(range(10**9))
+    benchmark(lambda: loop.run_until_complete(main.handle_toggle_ready(game_id, ids[next(toggles) % 2])))
+
+
+@pytest.mark.parametrize("size", ROOM_SIZES)
+def test_handle_end_turn(benchmark, loop, size):
+    game_id, ids = make_room(loop, size)
+    game_manager.active_games[game_id].phase = GamePhase.DECEPTION
+    benchmark(lambda: loop.run_until_complete(main.handle_end_turn(game_id, ids[0])))
+
+
+@pytest.mark.parametrize("size", ROOM_SIZES)
+def test_handle_finalize_votes(benchmark, loop, size):
+    game_id, ids = make_room(loop, size)
+    game = game_manager.active_games[game_id]
+
+    def setup():
+        game.impostorSchedule = list(game.loPlayers)
+        for voter in game.loPlayers:
+            game.castVote(voter, ids[1] if voter.id == ids[0] else ids[0])
+
+    benchmark.pedantic(lambda: loop.run_until_complete(main.handle_finalize_votes(game_id, ids[0])), setup=setup, rounds=200)
+
+
+@pytest.mark.parametrize("size", ROOM_SIZES)
+def test_handle_start_next_session(benchmark, loop, size):
+    game_id, ids = make_room(loop, size)
+    game = game_manager.active_games[game_id]
+
+    def setup():
+        game.impostorSchedule = list(game.loPlayers)
+        game.wordsAvailable = [f"word {i}" for i in range(5)]
+
+    benchmark.pedantic(lambda: loop.run_until_complete(main.handle_start_next_session(game_id, ids[0])), setup=setup, rounds=200)
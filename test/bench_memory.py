@@ -0,0 +1,58 @@
+import os
+import sys
+import gc
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from models import GamePlay, Player, SecretWordSession
+
+# Measures what live rooms cost in memory: every room gets PLAYERS_PER_ROOM
+# players (also kept in an active_players style dict) and a running session.
+#
+#   python test/bench_memory.py            10k and 100k rooms
+#   python test/bench_memory.py 5000       just 5k rooms
+
+ROOM_COUNTS = [10_000, 100_000]
+PLAYERS_PER_ROOM = 6
+
+
+def build_rooms(count: int):
+    games = {}
+    players = {}
+    for g in range(count):
+        game = GamePlay(f"G{g:06d}", f"P{g:06d}-0", 3, 30, "")
+        for i in range(PLAYERS_PER_ROOM):
+            player = Player(f"Player {i}", f"P{g:06d}-{i}")
+            players[player.id] = player
+            game.addNewPlayer(player)
+        game.currentSession = SecretWordSession(game.loPlayers, "lighthouse", game.loPlayers[0])
+        games[game.gameID] = game
+    return games, players
+
+
+def measure(count: int) -> tuple[int, int]:
+    gc.collect()
+    tracemalloc.start()
+    games, players = build_rooms(count)
+    total = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # Players alone, the rest is what each game adds on top of its players
+    tracemalloc.start()
+    alone = [Player(f"Player {i % PLAYERS_PER_ROOM}", f"Q{i:06d}-{i % PLAYERS_PER_ROOM}") for i in range(len(players))]
+    player_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del alone, games, players
+    return player_bytes, total
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or ROOM_COUNTS
+    print(f"{'rooms':>8} {'players':>8} {'bytes/player':>13} {'bytes/game':>11} {'total MB':>9}")
+    for count in counts:
+        player_bytes, total = measure(count)
+        players = count * PLAYERS_PER_ROOM
+        per_player = player_bytes / players
+        per_game = (total - player_bytes) / count
+        print(f"{count:>8} {players:>8} {per_player:>13.0f} {per_game:>11.0f} {total / 1e6:>9.1f}")
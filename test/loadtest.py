@@ -0,0 +1,269 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict, deque
+
+import httpx
+import websockets
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Load test: every simulated room registers its players over HTTP, opens a
+# websocket per player and plays full games (ready up, take turns, vote,
+# finalize, next session) until the server says the game is over.
+#
+#   python test/loadtest.py --spawn --rooms 200 --players 6
+#   python test/loadtest.py --url http://127.0.0.1:8000 --server-pid 1234 --rooms 50
+#
+# --spawn starts uvicorn on a free port with the backend's default words, so
+# no Anthropic key is needed. Latency is the time from sending a command to
+# the sender seeing the frame it causes.
+
+# Frames nobody waits for, dropped as they arrive
+IGNORED = {"player_ready_start_changed", "player_ready_changed", "player_joined", "player_disconnected", "ping", "game_started"}
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.sent = 0
+        self.received = 0
+        self.games = 0
+        self.errors = 0
+
+    def record(self, name: str, start: float):
+        self.latencies[name].append(time.perf_counter() - start)
+
+
+class Player:
+    def __init__(self, name: str, stats: Stats):
+        self.name = name
+        self.stats = stats
+        self.id: str = None
+        self.ws = None
+        # Frames read while waiting for another type, by type
+        self.stash = defaultdict(deque)
+
+    async def connect(self, base: str, game_id: str):
+        url = base.replace("http", "ws", 1) + f"/ws/{game_id}/{self.id}"
+        self.ws = await websockets.connect(url, max_queue=None)
+
+    async def send(self, message_type: str, data: dict = None):
+        self.stats.sent += 1
+        await self.ws.send(json.dumps({"type": message_type, "data": data or {}}))
+
+    async def expect(self, *types: str) -> dict:
+        # Next frame of one of types, keeping others for later
+        for message_type in types:
+            if self.stash[message_type]:
+                return self.stash[message_type].popleft()
+        while True:
+            message = json.loads(await self.ws.recv())
+            self.stats.received += 1
+            if message["type"] in types:
+                return message
+            if message["type"] == "game_deleted":
+                raise RuntimeError("game deleted")
+            if message["type"] not in IGNORED:
+                self.stash[message["type"]].append(message)
+
+    async def expect_votes(self, total: int):
+        # vote_update frames can be merged, wait until every vote is counted
+        while True:
+            message = await self.expect("vote_update")
+            if message["data"]["votes_in"] >= total:
+                return
+
+
+async def timed_post(client: httpx.AsyncClient, stats: Stats, path: str, **params) -> dict:
+    start = time.perf_counter()
+    response = await client.post(path, params=params)
+    stats.record(f"POST {path}", start)
+    response.raise_for_status()
+    return response.json()
+
+
+async def play_room(base: str, client: httpx.AsyncClient, stats: Stats, players: int, rounds: int, clue_time: int):
+    room = [Player(f"Bot {i}", stats) for i in range(players)]
+    for player in room:
+        player.id = (await timed_post(client, stats, "/player/register", name=player.name))["player_id"]
+    host = room[0]
+    game_id = (await timed_post(client, stats, "/game/create", host_id=host.id, max_round=rounds, clue_time=clue_time, secret_category=""))["game_id"]
+    for player in room[1:]:
+        await timed_post(client, stats, "/game/join", player_id=player.id, game_id=game_id)
+    await asyncio.gather(*(player.connect(base, game_id) for player in room))
+
+    try:
+        await timed_post(client, stats, "/game/start", game_id=game_id)
+        start = time.perf_counter()
+        await timed_post(client, stats, "/session/start", game_id=game_id)
+        await asyncio.gather(*(player.expect("session_started") for player in room))
+        stats.record("session_started", start)
+
+        while True:
+            # Everyone ready, the last toggle starts the clue phase
+            start = time.perf_counter()
+            await asyncio.gather(*(player.send("toggle_ready_start") for player in room))
+            started = await asyncio.gather(*(player.expect("clue_phase_started") for player in room))
+            stats.record("clue_phase_started", start)
+
+            # One clue each, in turn order
+            turn_id = started[0]["data"]["current_turn_id"]
+            by_id = {player.id: player for player in room}
+            for _ in range(players):
+                start = time.perf_counter()
+                await by_id[turn_id].send("end_turn")
+                turns = await asyncio.gather(*(player.expect("next_turn") for player in room))
+                stats.record("end_turn -> next_turn", start)
+                turn_id = turns[0]["data"]["player_id"]
+
+            start = time.perf_counter()
+            await asyncio.gather(*(player.send("toggle_ready") for player in room))
+            await asyncio.gather(*(player.expect("clue_phase_complete") for player in room))
+            stats.record("clue_phase_complete", start)
+
+            # Everyone votes for the host, the host for player 1, so no tie
+            start = time.perf_counter()
+            await asyncio.gather(*(player.send("submit_vote", {"vote_for_id": (room[1] if player is host else host).id}) for player in room))
+            await host.expect_votes(players)
+            stats.record("all votes in", start)
+
+            start = time.perf_counter()
+            await host.send("finalize_votes")
+            results = await asyncio.gather(*(player.expect("session_results") for player in room))
+            stats.record("finalize -> session_results", start)
+            if results[0]["data"]["game_over"]:
+                break
+
+            start = time.perf_counter()
+            await host.send("start_next_session")
+            await asyncio.gather(*(player.expect("session_started") for player in room))
+            stats.record("start_next_session -> session_started", start)
+        stats.games += 1
+    finally:
+        await host.send("quit_game")
+        for player in room:
+            await player.ws.close()
+
+
+class ServerSampler:
+    # CPU time and RSS of the server process, via psutil or /proc
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.peak_rss = 0
+        self.task: asyncio.Task = None
+
+    def cpu_seconds(self) -> float:
+        if psutil:
+            times = psutil.Process(self.pid).cpu_times()
+            return times.user + times.system
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+    def rss(self) -> int:
+        if psutil:
+            return psutil.Process(self.pid).memory_info().rss
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+        return 0
+
+    async def sample(self):
+        while True:
+            self.peak_rss = max(self.peak_rss, self.rss())
+            await asyncio.sleep(0.5)
+
+
+def spawn_server(port: int) -> subprocess.Popen:
+    backend = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+    env = {**os.environ, "ANTHROPIC_API_KEY": os.environ.get("ANTHROPIC_API_KEY", "load-test"), "WORD_TIMEOUT_SECONDS": "0.01"}
+    return subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                            cwd=backend, env=env, stdout=subprocess.DEVNULL)
+
+
+async def wait_for_server(base: str):
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                await client.get(f"{base}/docs")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"server at {base} did not come up")
+
+
+async def main(args):
+    server = None
+    base = args.url.rstrip("/")
+    pid = args.server_pid
+    if args.spawn:
+        server = spawn_server(args.port)
+        base = f"http://127.0.0.1:{args.port}"
+        pid = server.pid
+    try:
+        await wait_for_server(base)
+        stats = Stats()
+        sampler = ServerSampler(pid) if pid else None
+        if sampler:
+            cpu_before = sampler.cpu_seconds()
+            sampler.task = asyncio.create_task(sampler.sample())
+
+        limits = httpx.Limits(max_connections=args.concurrency * 2)
+        async with httpx.AsyncClient(base_url=base, limits=limits, timeout=60) as client:
+            gate = asyncio.Semaphore(args.concurrency)
+
+            async def one_room():
+                async with gate:
+                    try:
+                        await play_room(base, client, stats, args.players, args.rounds, args.clue_time)
+                    except Exception as e:
+                        stats.errors += 1
+                        print(f"room failed: {e!r}")
+
+            start = time.perf_counter()
+            await asyncio.gather(*(one_room() for _ in range(args.rooms)))
+            elapsed = time.perf_counter() - start
+
+        print(f"{stats.games}/{args.rooms} games of {args.players} players in {elapsed:.1f}s, {stats.errors} failed")
+        print(f"throughput: {stats.games / elapsed:.1f} games/s, {stats.sent / elapsed:.0f} msgs/s in, {stats.received / elapsed:.0f} frames/s out")
+        print(f"{'step':<40} {'count':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for name, values in stats.latencies.items():
+            print(f"{name:<40} {len(values):>7} {percentile(values, 50) * 1e3:>8.1f} {percentile(values, 95) * 1e3:>8.1f} {percentile(values, 99) * 1e3:>8.1f}")
+        if sampler:
+            sampler.task.cancel()
+            cpu = sampler.cpu_seconds() - cpu_before
+            print(f"server: {cpu:.1f}s CPU ({cpu / elapsed * 100:.0f}% of one core), peak RSS {sampler.peak_rss / 1e6:.0f} MB")
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plays many simulated games against a running server")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--spawn", action="store_true", help="start a server on --port for the run")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--server-pid", type=int, help="report CPU and RSS of this process")
+    parser.add_argument("--rooms", type=int, default=50)
+    parser.add_argument("--players", type=int, default=6)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--clue-time", type=int, default=0, help="0 turns the server's turn timer off")
+    parser.add_argument("--concurrency", type=int, default=50, help="rooms playing at once")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,122 @@
+import os
+import sys
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import audience
+from audience import AudienceRound
+from models import GamePlay, Player
+
+# Drives a game through random toggles, votes, quits and resets and checks
+# after every step that the running counters match a full recount.
+
+def test_counters_match_recount():
+    rng = random.Random(1234)
+    game = GamePlay("GAME01", "P0", 3, 30, "")
+    next_id = 0
+
+    for step in range(5000):
+        action = rng.random()
+        if action < 0.1 or len(game.loPlayers) < 2:
+            game.addNewPlayer(Player(f"Player {next_id}", f"P{next_id}"))
+            next_id += 1
+        elif action < 0.15:
+            game.removePlayer(rng.choice(game.loPlayers))
+        elif action < 0.3:
+            game.toggleReadyToVote(rng.choice(game.loPlayers))
+        elif action < 0.45:
+            game.toggleReadyToStart(rng.choice(game.loPlayers))
+        elif action < 0.9:
+            target = rng.choice(game.loPlayers).id
+            game.castVote(rng.choice(game.loPlayers), target)
+        elif action < 0.93:
+            game.resetVotes()
+        elif action < 0.95:
+            game.resetReady()
+        elif action < 0.97:
+            game.resetRound(points=rng.random() < 0.5)
+        else:
+            game.resetReadyToStart()
+
+        game.checkCounters()
+
+        if not game.isVoteTie() and game.maxVotes:
+            assert game.voteLeader().votes == game.maxVotes
+
+
+
+def test_audience_mode_matches_players():
+    # The same random steps on a normal room and an audience-mode one
+    rng = random.Random(99)
+    for use_numpy in [False] + ([True] if audience.numpy else []):
+        plain = GamePlay("GAME01", "P0", 3, 30, "")
+        packed = GamePlay("GAME02", "P0", 3, 30, "")
+        for i in range(5):
+            plain.addNewPlayer(Player(f"Player {i}", f"P{i}"))
+            packed.addNewPlayer(Player(f"Player {i}", f"P{i}"))
+        packed.audience = AudienceRound(packed.loPlayers, use_numpy)
+        next_id = 5
+
+        for step in range(5000):
+            action = rng.random()
+            if action < 0.1 or len(plain.loPlayers) < 2:
+                for game in (plain, packed):
+                    game.addNewPlayer(Player(f"Player {next_id}", f"P{next_id}"))
+                next_id += 1
+                continue
+            index = rng.randrange(len(plain.loPlayers))
+            other = rng.randrange(len(plain.loPlayers))
+            for game in (plain, packed):
+                player = game.loPlayers[index]
+                if action < 0.15:
+                    game.removePlayer(player)
+                elif action < 0.3:
+                    game.toggleReadyToVote(player)
+                elif action < 0.45:
+                    game.toggleReadyToStart(player)
+                elif action < 0.9:
+                    game.castVote(player, game.loPlayers[other].id)
+                elif action < 0.93:
+                    game.resetVotes()
+                elif action < 0.95:
+                    game.resetReady()
+                elif action < 0.97:
+                    game.resetRound()
+                else:
+                    game.resetReadyToStart()
+
+            assert packed.voteCounts() == plain.voteCounts()
+            assert packed.isVoteTie() == plain.isVoteTie()
+            if not plain.isVoteTie():
+                assert getattr(packed.voteLeader(), "id", None) == getattr(plain.voteLeader(), "id", None)
+            packed.checkCounters()
+            plain.checkCounters()
+            for p, q in zip(plain.loPlayers, packed.loPlayers):
+                assert (p.votes, p.has_voted, p.voted_for_id, p.ready_to_vote, p.ready_to_start) == \
+                    (q.votes, q.has_voted, q.voted_for_id, q.ready_to_vote, q.ready_to_start)
+
+
+def test_remove_self_voter():
+    # P0 votes for themselves and leaves, P1's vote for P0 is handed back
+    # and P2's vote for P1 stays
+    for use_numpy in [None, False] + ([True] if audience.numpy else []):
+        game = GamePlay("GAME01", "P0", 3, 30, "")
+        for i in range(4):
+            game.addNewPlayer(Player(f"Player {i}", f"P{i}"))
+        if use_numpy is not None:
+            game.audience = AudienceRound(game.loPlayers, use_numpy)
+        game.castVote(game.loPlayers[0], "P0")
+        game.castVote(game.loPlayers[1], "P0")
+        game.castVote(game.loPlayers[2], "P1")
+        game.removePlayer(game.loPlayers[0])
+        game.checkCounters()
+        assert game.votesIn == 1
+        assert game.voteCounts() == [1, 0, 0]
+
+
+if __name__ == "__main__":
+    test_counters_match_recount()
+    test_audience_mode_matches_players()
+    test_remove_self_voter()
+    print("counters ok")
@@ -0,0 +1,84 @@
+import os
+import sys
+import asyncio
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from audience import AUDIENCE_THRESHOLD
+from game_store import MemoryGameStore, SQLiteGameStore, snapshot_game
+from models import GamePhase, GamePlay, Player, SecretWordSession
+
+# Saves games in the middle of a vote through each store and checks that
+# loading them back gives the same rooms, counters included.
+
+def make_game(game_id: str, size: int, rng: random.Random) -> GamePlay:
+    game = GamePlay(game_id, "P0", 3, 30, "")
+    for i in range(size):
+        game.addNewPlayer(Player(f"Player {i}", f"{game_id}-P{i}"))
+    game.impostorSchedule = game.loPlayers[1:3]
+    game.wordsAvailable = ["apple", "river"]
+    game.wordsUsed = ["piano"]
+    game.currentSession = SecretWordSession(game.loPlayers, "piano", game.loPlayers[0])
+    game.currentSession.currentTurnIndex = 1
+    game.updateRoundMode()
+    game.phase = GamePhase.VOTING
+    for player in rng.sample(game.loPlayers, size // 2):
+        game.castVote(player, rng.choice(game.loPlayers).id)
+    for player in rng.sample(game.loPlayers, size // 3):
+        game.toggleReadyToVote(player)
+    game.loPlayers[0].points = 2
+    return game
+
+
+def round_trip(store, games: dict[str, GamePlay], players: dict[str, Player]):
+    store.games, store.players = games, players
+    for game_id in games:
+        store.mark_dirty(game_id)
+    for player_id in players:
+        store.mark_player(player_id)
+    asyncio.run(store.flush())
+    return store.load()
+
+
+def test_round_trip(tmp_path):
+    for store in (MemoryGameStore(), SQLiteGameStore(str(tmp_path / "games.db"))):
+        rng = random.Random(7)
+        games = {
+            "SMALL1": make_game("SMALL1", 5, rng),
+            "CROWD1": make_game("CROWD1", AUDIENCE_THRESHOLD + 20, rng),
+        }
+        players = {p.id: p for game in games.values() for p in game.loPlayers}
+        players["LOBBY1"] = Player("Not in a game", "LOBBY1")
+        assert games["CROWD1"].audience and not games["SMALL1"].audience
+
+        restored_games, restored_players = round_trip(store, games, players)
+
+        assert set(restored_games) == set(games)
+        assert set(restored_players) == set(players)
+        for game_id, game in games.items():
+            restored = restored_games[game_id]
+            assert snapshot_game(restored) == snapshot_game(game)
+            assert bool(restored.audience) == bool(game.audience)
+            assert (restored.votesIn, restored.readyToVoteCount, restored.maxVotes) == (game.votesIn, game.readyToVoteCount, game.maxVotes)
+            assert restored.voteCounts() == game.voteCounts()
+            assert getattr(restored.voteLeader(), "id", None) == getattr(game.voteLeader(), "id", None)
+            restored.checkCounters()
+            # Games and active_players share the same Player objects
+            assert all(restored_players[p.id] is p for p in restored.loPlayers)
+
+        # A vote after the restore lands on the restored arrays
+        crowd = restored_games["CROWD1"]
+        voter = next(p for p in crowd.loPlayers if not crowd.audience.has_voted[crowd.audience.slots[p.id]])
+        crowd.castVote(voter, crowd.loPlayers[0].id)
+        crowd.checkCounters()
+
+        # Deleted games and players lose their rows
+        del games["SMALL1"]
+        del players["LOBBY1"]
+        store.mark_dirty("SMALL1")
+        store.mark_player("LOBBY1")
+        asyncio.run(store.flush())
+        restored_games, restored_players = store.load()
+        assert set(restored_games) == {"CROWD1"}
+        assert "LOBBY1" not in restored_players